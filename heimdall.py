@@ -14,13 +14,12 @@ It can be run in interactive mode to add/remove servers or in check mode to moni
 import os
 import sys
 import time
-import json
+import signal
 import logging
 import argparse
-import paramiko
 from heimdall.config import load_config, ServerConfig, CONFIG_FILE
 from heimdall.monitor import ServerMonitor
-from heimdall.utils import setup_logging, Colors, LOG_FILE
+from heimdall.utils import setup_logging, Colors, LOG_FILE, write_json_file
 from heimdall.alerts import AlertManager
 
 # Setup logging
@@ -119,24 +118,9 @@ def add_server(monitor):
     
     # Get the real hostname for nickname
     try:
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        # Connection parameters
-        connect_params = {
-            'hostname': hostname,
-            'port': port,
-            'username': username,
-            'timeout': 5
-        }
-        
-        # Try SSH key authentication if key_path is provided
-        if key_path and os.path.exists(key_path):
-            connect_params['key_filename'] = key_path
-        elif password:
-            connect_params['password'] = password
-        
-        client.connect(**connect_params)
+        # Reuse the connection opened by the connection test
+        client = monitor.get_connection({'hostname': hostname, 'port': port, 'username': username,
+                                         'password': password, 'key_path': key_path})
         
         # Get the real hostname
         stdin, stdout, stderr = client.exec_command("hostname")
@@ -412,8 +396,7 @@ def configure_openrouter():
                 openrouter_config['model'] = custom_model
     
     # Save config
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(current_config, f, indent=2)
+    write_json_file(CONFIG_FILE, current_config)
     
     print(f"\n{Colors.green('OpenRouter settings updated successfully!')}")
     
@@ -490,8 +473,7 @@ def configure_telegram():
             telegram_config['subscribers'] = []
     
     # Save config
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(current_config, f, indent=2)
+    write_json_file(CONFIG_FILE, current_config)
     
     print(f"\n{Colors.green('Telegram settings updated successfully!')}")
     
@@ -761,8 +743,7 @@ def configure_smtp():
             email_config['recipients'] = [r.strip() for r in recipients_input.split(',')]
     
     # Save config
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(current_config, f, indent=2)
+    write_json_file(CONFIG_FILE, current_config)
     
     print(f"\n{Colors.green('SMTP settings updated successfully!')}")
     
@@ -866,6 +847,10 @@ def main():
                 print(f"Current subscribers: {len(bot.subscribers)}")
                 print(f"\n{Colors.blue('Listening for commands...')}")
                 
+                # Stop on SIGTERM (e.g. from systemd) the same way as on Ctrl+C,
+                # so pending subscriber changes are saved
+                signal.signal(signal.SIGTERM, signal.default_int_handler)
+                
                 # Start polling
                 bot.start_polling()
                 
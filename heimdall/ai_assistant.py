@@ -21,6 +21,8 @@ class AIAssistant:
         self.model = self.openrouter_config.get('model', 'deepseek/deepseek-r1-0528:free')
         self.enabled = self.openrouter_config.get('enabled', False)
         self.base_url = "https://openrouter.ai/api/v1"
+        # Keep-alive connection reused by every disk analysis in a run
+        self.http = requests.Session()
         
     def is_configured(self) -> bool:
         """Check if OpenRouter is properly configured."""
@@ -83,7 +85,7 @@ Keep your response concise and actionable, focusing on the most important findin
             }
             
             logger.info(f"Sending disk analysis request to OpenRouter for {server_name}")
-            response = requests.post(
+            response = self.http.post(
                 f"{self.base_url}/chat/completions",
                 headers=headers,
                 json=data,
@@ -148,7 +150,7 @@ Keep your response concise and actionable, focusing on the most important findin
                 "max_tokens": 50
             }
             
-            response = requests.post(
+            response = self.http.post(
                 f"{self.base_url}/chat/completions",
                 headers=headers,
                 json=data,
@@ -7,60 +7,657 @@ This module handles alert generation, tracking, and email notifications.
 """
 
 import os
+import copy
 import json
+import time
+import queue
+import atexit
+import sqlite3
 import hashlib
 import logging
-import smtplib
+import logging.handlers
+import functools
+import threading
+from collections import namedtuple
+from html import escape as html_escape
 from datetime import datetime
-from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
-from email.mime.multipart import MIMEMultipart
 from .telegram import TelegramBot
+from .utils import ALERT_LOG_FILE, json_loads, json_dumps
 
-# Alert status file
+# Alert status database. The JSON file of older installs is still read once
+# for migration.
+ALERT_STATUS_DB = "alert_status.db"
 ALERT_STATUS_FILE = "alert_status.json"
 
+# Heimdall logo, embedded inline in alert emails
+LOGO_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "HEIMDALL.png")
+LOGO_CID = "heimdall_logo"
+LOGO_URL = "https://raw.githubusercontent.com/bnesim/heimdall-monitoring/refs/heads/main/HEIMDALL.png"
+
+# Maximum number of emails sent over one SMTP connection before reconnecting
+SMTP_MAX_REUSE = 100
+
+# Default SMTP send rate limit: sustained emails per second and burst size
+EMAIL_RATE_PER_SEC = 5
+EMAIL_BURST = 20
+
+# Size at which logs/alerts.log is rotated, and number of old files kept
+ALERT_LOG_MAX_BYTES = 10_000_000
+ALERT_LOG_BACKUP_COUNT = 5
+
+# Minimum seconds between saves of routine (non-notifying) alert updates
+ALERT_STATUS_FLUSH_INTERVAL = 60
+
+# Timestamp fields of an alert record, held as datetime objects in memory and
+# stored as TIMESTAMP_FORMAT strings
+ALERT_TIMESTAMP_FIELDS = ("first_detected", "last_detected", "last_notified", "resolved_time")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Alert IDs are blake2b digests of this many bytes (older installs used MD5)
+ALERT_ID_DIGEST_SIZE = 8
+
+# Templates for the single-alert emails, filled in with str.format_map()
+ALERT_EMAIL_TEMPLATE = """
+            <html>
+              <head>
+                <style>
+                  body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; background-color: #f9f9f9; margin: 0; padding: 0; }}
+                  .container {{ max-width: 600px; margin: 20px auto; padding: 20px; background-color: #fff; border-radius: 5px; border-top: 5px solid #ff3860; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1); }}
+                  h1 {{ color: #ff3860; margin-top: 0; }}
+                  .logo {{ text-align: center; margin-bottom: 20px; }}
+                  .logo img {{ width: 150px; height: auto; }}
+                  .server-info {{ background-color: #f5f5f5; padding: 15px; border-radius: 4px; margin: 20px 0; }}
+                  .server-name {{ font-size: 18px; font-weight: bold; color: #333; }}
+                  .server-hostname {{ color: #777; font-family: monospace; }}
+                  .alert-message {{ font-size: 18px; color: #ff3860; background-color: #ffeeee; padding: 10px; border-radius: 4px; margin: 15px 0; }}
+                  .timestamp {{ color: #777; font-size: 14px; margin-top: 20px; }}
+                  .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #777; }}
+                  .open-alerts {{ margin: 20px 0; padding: 15px; background-color: #f8f9fa; border-radius: 4px; border-left: 4px solid #ffc107; }}
+                </style>
+              </head>
+              <body>
+                <div class="container">
+                  <div class="logo">
+                    <img src="{logo_src}" alt="Heimdall Logo">
+                  </div>
+                  <h1>⚠️ Heimdall Server Alert ⚠️</h1>
+                  <p>Heimdall has detected an issue that requires your attention.</p>
+                  
+                  <div class="server-info">
+                    <div class="server-name">{nickname}</div>
+                    <div class="server-hostname">{hostname}</div>
+                  </div>
+                  
+                  <div class="alert-message">
+                    {message_html}
+                  </div>
+                  
+                  <div class="timestamp">
+                    Detected: {detected}
+                  </div>
+                  
+                  {open_alerts_html}
+                  
+                  <div class="footer">
+                    This is an automated message from Heimdall, the all-seeing guardian of your servers.
+                    <br>You will not receive another notification about this issue for at least {alert_cooldown} hour(s).
+                  </div>
+                </div>
+              </body>
+            </html>
+            """
+
+RESOLUTION_EMAIL_TEMPLATE = """
+            <html>
+            <head>
+                <style>
+                    body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; background-color: #f9f9f9; margin: 0; padding: 0; }}
+                    .container {{ max-width: 600px; margin: 20px auto; padding: 20px; background-color: #fff; border-radius: 5px; border-top: 5px solid #48c774; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1); }}
+                    h1 {{ color: #48c774; margin-top: 0; }}
+                    .logo {{ text-align: center; margin-bottom: 20px; }}
+                    .logo img {{ width: 150px; height: auto; }}
+                    .server-info {{ background-color: #f5f5f5; padding: 15px; border-radius: 4px; margin: 20px 0; }}
+                    .server-name {{ font-size: 18px; font-weight: bold; color: #333; }}
+                    .server-hostname {{ color: #777; font-family: monospace; }}
+                    .resolve-message {{ font-size: 18px; color: #48c774; background-color: #effaf5; padding: 10px; border-radius: 4px; margin: 15px 0; }}
+                    .alert-details {{ background-color: #f5f5f5; padding: 12px; border-radius: 4px; margin: 15px 0; font-size: 14px; }}
+                    .detail-row {{ display: flex; justify-content: space-between; margin-bottom: 5px; border-bottom: 1px solid #eee; padding-bottom: 5px; }}
+                    .detail-label {{ font-weight: bold; }}
+                    .timestamp {{ color: #777; font-size: 14px; margin-top: 20px; }}
+                    .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #777; }}
+                    .open-alerts {{ margin: 20px 0; padding: 15px; background-color: #f8f9fa; border-radius: 4px; border-left: 4px solid #ffc107; }}
+                </style>
+            </head>
+            <body>
+                <div class="container">
+                    <div class="logo">
+                        <img src="{logo_src}" alt="Heimdall Logo">
+                    </div>
+                    <h1>✅ Alert Resolved</h1>
+                    <p>Heimdall has detected that a previous alert has been resolved.</p>
+                    
+                    <div class="server-info">
+                        <div class="server-name">{nickname}</div>
+                        <div class="server-hostname">{hostname}</div>
+                    </div>
+                    
+                    <div class="resolve-message">
+                        {metric} usage has returned to normal levels: {current_value:.1f}% (threshold: {threshold}%)
+                    </div>
+                    
+                    <div class="alert-details">
+                        <div class="detail-row">
+                            <span class="detail-label">First Detected:</span>
+                            <span>{first_detected}</span>
+                        </div>
+                        <div class="detail-row">
+                            <span class="detail-label">Resolved:</span>
+                            <span>{resolved_time}</span>
+                        </div>
+                        <div class="detail-row">
+                            <span class="detail-label">Duration:</span>
+                            <span>{duration_str}</span>
+                        </div>
+                        <div class="detail-row">
+                            <span class="detail-label">Original Issue:</span>
+                            <span>{original_message}</span>
+                        </div>
+                    </div>
+                    
+                    {open_alerts_html}
+                    
+                    <div class="footer">
+                        This is an automated message from Heimdall, the all-seeing guardian of your servers.
+                    </div>
+                </div>
+            </body>
+            </html>
+            """
+
+# Static parts of the open alerts table included in alert emails
+OPEN_ALERTS_TABLE_HEADER = """
+        <div class="open-alerts">
+            <h3 style="color: #333; margin: 20px 0 10px 0;">Other Open Alerts:</h3>
+            <table style="width: 100%; border-collapse: collapse; margin-bottom: 20px;">
+                <thead>
+                    <tr style="background-color: #f5f5f5;">
+                        <th style="padding: 8px; text-align: left; border-bottom: 1px solid #ddd;">Server</th>
+                        <th style="padding: 8px; text-align: left; border-bottom: 1px solid #ddd;">Issue</th>
+                        <th style="padding: 8px; text-align: left; border-bottom: 1px solid #ddd;">Duration</th>
+                    </tr>
+                </thead>
+                <tbody>
+        """
+
+OPEN_ALERTS_TABLE_ROW = """
+                    <tr>
+                        <td style="padding: 8px; border-bottom: 1px solid #eee; font-family: monospace;">{server}</td>
+                        <td style="padding: 8px; border-bottom: 1px solid #eee;">{message}</td>
+                        <td style="padding: 8px; border-bottom: 1px solid #eee;">{duration}</td>
+                    </tr>
+            """
+
+OPEN_ALERTS_TABLE_FOOTER = """
+                </tbody>
+            </table>
+        </div>
+        """
+
+# Templates for the batched session emails, filled in with str.format_map()
+BATCH_ALERTS_EMAIL_TEMPLATE = """
+            <html>
+              <head>
+                <style>
+                  body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; background-color: #f9f9f9; margin: 0; padding: 0; }}
+                  .container {{ max-width: 800px; margin: 20px auto; padding: 20px; background-color: #fff; border-radius: 5px; border-top: 5px solid #ff3860; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1); }}
+                  h1 {{ color: #ff3860; margin-top: 0; }}
+                  h2 {{ color: #333; margin-top: 30px; border-bottom: 2px solid #eee; padding-bottom: 10px; }}
+                  .logo {{ text-align: center; margin-bottom: 20px; }}
+                  .logo img {{ width: 150px; height: auto; }}
+                  .server-section {{ background-color: #f5f5f5; padding: 15px; border-radius: 4px; margin: 20px 0; }}
+                  .server-name {{ font-size: 18px; font-weight: bold; color: #333; }}
+                  .alert-item {{ margin: 10px 0; padding: 10px; border-left: 4px solid #ff3860; background-color: #fff; }}
+                  .new-alert {{ border-left-color: #ff3860; }}
+                  .recurring-alert {{ border-left-color: #ffc107; }}
+                  .alert-type {{ display: inline-block; padding: 2px 8px; border-radius: 3px; font-size: 12px; font-weight: bold; margin-right: 10px; }}
+                  .type-new {{ background-color: #ff3860; color: white; }}
+                  .type-recurring {{ background-color: #ffc107; color: #333; }}
+                  .timestamp {{ color: #777; font-size: 14px; margin-top: 20px; }}
+                  .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #777; }}
+                  .summary {{ background-color: #f8f9fa; padding: 15px; border-radius: 4px; margin: 20px 0; }}
+                  .summary-item {{ display: inline-block; margin-right: 20px; }}
+                  .summary-count {{ font-size: 24px; font-weight: bold; }}
+                  .summary-label {{ font-size: 14px; color: #666; }}
+                </style>
+              </head>
+              <body>
+                <div class="container">
+                  <div class="logo">
+                    <img src="{logo_src}" alt="Heimdall Logo">
+                  </div>
+                  <h1>⚠️ Heimdall Alert Summary ⚠️</h1>
+                  
+                  <div class="summary">
+                    <div class="summary-item">
+                      <div class="summary-count" style="color: #ff3860;">{new_count}</div>
+                      <div class="summary-label">New Alerts</div>
+                    </div>
+                    <div class="summary-item">
+                      <div class="summary-count" style="color: #ffc107;">{recurring_count}</div>
+                      <div class="summary-label">Recurring Alerts</div>
+                    </div>
+                    <div class="summary-item">
+                      <div class="summary-count" style="color: #666;">{server_count}</div>
+                      <div class="summary-label">Affected Servers</div>
+                    </div>
+                  </div>
+                  {servers_html}
+                  <div class="timestamp">
+                    Detected: {detected}
+                  </div>
+                  
+                  {open_alerts_html}
+                  
+                  <div class="footer">
+                    This is an automated batch alert from Heimdall monitoring system.
+                    <br>You will not receive another notification about these issues for at least {alert_cooldown} hour(s).
+                  </div>
+                </div>
+              </body>
+            </html>
+            """
+
+BATCH_RESOLUTIONS_EMAIL_TEMPLATE = """
+            <html>
+              <head>
+                <style>
+                  body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; background-color: #f9f9f9; margin: 0; padding: 0; }}
+                  .container {{ max-width: 800px; margin: 20px auto; padding: 20px; background-color: #fff; border-radius: 5px; border-top: 5px solid #48c774; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1); }}
+                  h1 {{ color: #48c774; margin-top: 0; }}
+                  .logo {{ text-align: center; margin-bottom: 20px; }}
+                  .logo img {{ width: 150px; height: auto; }}
+                  .server-section {{ background-color: #f5f5f5; padding: 15px; border-radius: 4px; margin: 20px 0; }}
+                  .server-name {{ font-size: 18px; font-weight: bold; color: #333; }}
+                  .resolution-item {{ margin: 10px 0; padding: 10px; border-left: 4px solid #48c774; background-color: #fff; }}
+                  .metric-info {{ margin-top: 5px; font-size: 14px; color: #666; }}
+                  .duration {{ color: #777; font-style: italic; }}
+                  .timestamp {{ color: #777; font-size: 14px; margin-top: 20px; }}
+                  .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #777; }}
+                  .summary {{ background-color: #f8f9fa; padding: 15px; border-radius: 4px; margin: 20px 0; }}
+                  .summary-count {{ font-size: 24px; font-weight: bold; color: #48c774; }}
+                  .summary-label {{ font-size: 14px; color: #666; }}
+                </style>
+              </head>
+              <body>
+                <div class="container">
+                  <div class="logo">
+                    <img src="{logo_src}" alt="Heimdall Logo">
+                  </div>
+                  <h1>✅ Alerts Resolved</h1>
+                  
+                  <div class="summary">
+                    <div class="summary-count">{total_resolved}</div>
+                    <div class="summary-label">Issues Resolved on {server_count} server(s)</div>
+                  </div>
+                  {servers_html}
+                  <div class="timestamp">
+                    Resolved: {resolved}
+                  </div>
+                  
+                  {open_alerts_html}
+                  
+                  <div class="footer">
+                    This is an automated resolution notification from Heimdall monitoring system.
+                  </div>
+                </div>
+              </body>
+            </html>
+            """
+
+# Per-server section and per-alert items of the batched emails
+BATCH_SERVER_SECTION_HEADER = """
+                  <div class="server-section">
+                    <div class="server-name">{server}</div>
+                """
+
+BATCH_NEW_ALERT_ITEM = """
+                    <div class="alert-item new-alert">
+                      <span class="alert-type type-new">NEW</span>
+                      {message_html}
+                    </div>
+                    """
+
+BATCH_RECURRING_ALERT_ITEM = """
+                    <div class="alert-item recurring-alert">
+                      <span class="alert-type type-recurring">RECURRING</span>
+                      {message_html}
+                    </div>
+                    """
+
+BATCH_RESOLUTION_ITEM = """
+                    <div class="resolution-item">
+                      <strong>{metric}</strong> has returned to normal
+                      <div class="metric-info">
+                        Current: {current_value:.1f}% (threshold: {threshold}%)
+                        <br><span class="duration">Problem duration: {duration}</span>
+                      </div>
+                    </div>
+                    """
+
+# Alert queued during a session for the batched notifications
+SessionAlert = namedtuple("SessionAlert", "server hostname message type alert_id is_new is_recurring")
+
 logger = logging.getLogger("Heimdall")
 
+# Dedicated logger for logs/alerts.log, kept separate from the main log
+alert_file_logger = logging.getLogger("Heimdall.alerts_file")
+alert_file_logger.propagate = False
+
+def _get_alert_file_logger():
+    """Return the alerts.log logger, attaching its handlers on first use.
+
+    Records are queued and written to a rotating file by a background
+    listener thread, so alerting threads never block on the file.
+    """
+    if not alert_file_logger.handlers:
+        os.makedirs(os.path.dirname(ALERT_LOG_FILE), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            ALERT_LOG_FILE, maxBytes=ALERT_LOG_MAX_BYTES, backupCount=ALERT_LOG_BACKUP_COUNT)
+        handler.setFormatter(logging.Formatter('[%(asctime)s] %(message)s', datefmt="%Y-%m-%d %H:%M:%S"))
+        records = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, handler)
+        listener.start()
+        atexit.register(listener.stop)
+        alert_file_logger.addHandler(logging.handlers.QueueHandler(records))
+        alert_file_logger.setLevel(logging.INFO)
+    return alert_file_logger
+
+def format_duration(duration, detailed=False):
+    """Format a timedelta as a human readable duration string.
+
+    Durations of a day or more show days and hours; ``detailed`` adds minutes.
+    """
+    days, seconds = divmod(int(duration.total_seconds()), 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes = seconds // 60
+    if days > 0:
+        if detailed:
+            return f"{days} days, {hours} hours, {minutes} minutes"
+        return f"{days} days, {hours} hours"
+    return f"{hours} hours, {minutes} minutes"
+
+def _html_text(text):
+    """Escape text for inclusion in an HTML email, keeping its line breaks."""
+    return html_escape(text).replace(chr(10), '<br>')
+
+@functools.lru_cache(maxsize=256)
+def _batch_alert_subject(new_count, recurring_count):
+    """Return the subject line of a batch alert email."""
+    if new_count > 0 and recurring_count > 0:
+        return f"HEIMDALL ALERTS: {new_count} new, {recurring_count} recurring issues detected"
+    elif new_count > 0:
+        return f"HEIMDALL NEW ALERTS: {new_count} new issues detected"
+    return f"HEIMDALL RECURRING ALERTS: {recurring_count} issues persist"
+
+@functools.lru_cache(maxsize=256)
+def _batch_alert_telegram_header(new_count, recurring_count):
+    """Return the heading and counts line of a batch Telegram alert."""
+    if new_count > 0 and recurring_count > 0:
+        return f"<b>⚠️ HEIMDALL ALERT SUMMARY</b>\n\n<b>{new_count}</b> new issues, <b>{recurring_count}</b> recurring issues\n"
+    elif new_count > 0:
+        return f"<b>⚠️ NEW HEIMDALL ALERTS</b>\n\n<b>{new_count}</b> new issues detected\n"
+    return f"<b>⚠️ RECURRING HEIMDALL ALERTS</b>\n\n<b>{recurring_count}</b> issues persist\n"
+
+def _synchronized(method):
+    """Run an AlertManager method while holding the manager's lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _decode_alert(alert):
+    """Parse the stored timestamp strings of an alert record into datetimes."""
+    for field in ALERT_TIMESTAMP_FIELDS:
+        value = alert.get(field)
+        if isinstance(value, str):
+            alert[field] = datetime.fromisoformat(value)
+    return alert
+
+def _encode_alert(alert):
+    """Return a copy of an alert record with its datetimes formatted for storage."""
+    return {key: value.strftime(TIMESTAMP_FORMAT) if isinstance(value, datetime) else value
+            for key, value in alert.items()}
+
+
 class AlertManager:
     def __init__(self, config):
         self.config = config
+        # Servers may be checked from several threads at once
+        self._lock = threading.RLock()
+        # Unsaved changes in alert_status and time of the last save
+        self._dirty = False
+        self._dirty_ids = set()
+        self._last_flush_ts = time.time()
+        self._db = None
+        # (table, serialized data) last written for each alert ID
+        self._saved_rows = {}
+        # Rendered open alerts sections, valid until active alerts change
+        self._open_alerts_cache = {}
         self.alert_status = self.load_alert_status()
+        atexit.register(self.close)
         self.telegram_bot = TelegramBot(config)
-        if self.telegram_bot.is_configured():
+        
+        # Notification channels are fixed for the lifetime of the manager
+        self._email_enabled = bool(self.config and self.config.get('email', {}).get('enabled', False))
+        self._telegram_enabled = self.telegram_bot.is_configured()
+        # In webhook mode only the --telegram-bot service receives updates; a
+        # one-shot command must not bind the port or re-register the webhook
+        if self._telegram_enabled and not self.telegram_bot.webhook_url:
             self.telegram_bot.start_polling()
         
+        # Hours between repeat notifications for the same alert. The cooldown
+        # doubles with each repeat notification, up to alert_cooldown_max hours.
+        self._alert_cooldown_hours = (self.config or {}).get('alert_cooldown', 1)  # Default to 1 hour if not configured
+        self._alert_cooldown_max_hours = max((self.config or {}).get('alert_cooldown_max', 8), self._alert_cooldown_hours)
+        
+        # SMTP settings resolved once from the nested email config
+        email_config = (self.config or {}).get('email', {})
+        self._email_from = email_config.get('sender')
+        self._email_recipients = list(email_config.get('recipients', []))
+        self._email_to_str = ", ".join(self._email_recipients)
+        self._smtp_host = email_config.get('smtp_server')
+        self._smtp_port = email_config.get('smtp_port')
+        self._smtp_tls = email_config.get('use_tls', False)
+        self._smtp_user = email_config.get('username')
+        self._smtp_pass = email_config.get('password')
+        
+        # SMTP connection reused across the emails of a session
+        self._smtp = None
+        self._smtp_sends = 0
+        
+        # Token bucket limiting the SMTP send rate; emails over the limit are
+        # held back and sent on a later check run. A rate of 0 or less turns
+        # the limit off, and the burst is at least one email.
+        email_rate = email_config.get('rate_per_sec', EMAIL_RATE_PER_SEC)
+        self._email_rate = email_rate if email_rate and email_rate > 0 else None
+        self._email_burst = max(1, email_config.get('burst', EMAIL_BURST))
+        self._bucket = {"tokens": self._email_burst, "last": time.monotonic()}
+        self._deferred_emails = []
+        
         # Session-based alert collection
         self.session_active = False
         self.session_new_alerts = []
         self.session_resolved_alerts = []
         self.session_recurring_alerts = []
+        # Alert IDs already processed in the current session
+        self._seen_this_tick = set()
+        # Epoch time at which each active alert may notify again
+        self._next_notify_ts = {}
+        
+        # Pre-built message carrying the headers shared by every alert email,
+        # created on first use
+        self._msg_template = None
+        
+        # Logo image part, read once and attached inline to every alert email.
+        # Falls back to the remote image if the file is not available.
+        self._logo_part = None
+        self._logo_src = LOGO_URL
+        if self._email_enabled:
+            from email.mime.image import MIMEImage
+            try:
+                with open(LOGO_FILE, 'rb') as f:
+                    self._logo_part = MIMEImage(f.read(), _subtype='png')
+                self._logo_part.add_header('Content-ID', f"<{LOGO_CID}>")
+                self._logo_part.add_header('Content-Disposition', 'inline', filename='HEIMDALL.png')
+                self._logo_src = f"cid:{LOGO_CID}"
+            except OSError as e:
+                logger.warning(f"Could not load logo for inline embedding: {str(e)}")
+    
+    def _mark_dirty(self, *alert_ids):
+        """Flag alerts as needing to be written to the database."""
+        self._dirty = True
+        self._dirty_ids.update(alert_ids)
+        self._open_alerts_cache = {}
+    
+    def _open_db(self):
+        """Open the alert status database, creating the schema if needed."""
+        db = sqlite3.connect(ALERT_STATUS_DB, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS active_alerts (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS resolved_alerts (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        return db
+    
+    def _load_legacy_alert_status(self):
+        """Load alert status from the JSON file used by older installs."""
+        status = {"active_alerts": {}, "resolved_alerts": {}}
+        try:
+            with open(ALERT_STATUS_FILE, 'rb') as f:
+                status = json_loads(f.read())
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError:
+            logger.error(f"Invalid JSON in {ALERT_STATUS_FILE}")
+        return status
     
     def load_alert_status(self):
-        """Load the alert status from file."""
-        if os.path.exists(ALERT_STATUS_FILE):
-            try:
-                with open(ALERT_STATUS_FILE, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                logger.error(f"Invalid JSON in {ALERT_STATUS_FILE}")
-                return {"active_alerts": {}, "resolved_alerts": {}}
+        """Load the alert status from the database."""
+        is_new_db = not os.path.exists(ALERT_STATUS_DB)
+        self._db = self._open_db()
+        
+        if is_new_db:
+            # Migrate state from an older JSON-based install on the next save
+            status = self._load_legacy_alert_status()
+            for section in ("active_alerts", "resolved_alerts"):
+                for alert_id in status[section]:
+                    self._mark_dirty(alert_id)
         else:
-            return {"active_alerts": {}, "resolved_alerts": {}}
+            status = {}
+            for section in ("active_alerts", "resolved_alerts"):
+                status[section] = {}
+                for alert_id, data in self._db.execute(f"SELECT id, data FROM {section}"):
+                    status[section][alert_id] = json_loads(data)
+                    self._saved_rows[alert_id] = (section, data)
+        
+        for section in ("active_alerts", "resolved_alerts"):
+            for alert in status[section].values():
+                _decode_alert(alert)
+        self._migrate_alert_ids(status)
+        return status
+    
+    def _migrate_alert_ids(self, status):
+        """Rekey alerts stored under old MD5 IDs to the current alert ID scheme."""
+        migrated = 0
+        for section in ("active_alerts", "resolved_alerts"):
+            alerts = status[section]
+            for old_id in [alert_id for alert_id in alerts if len(alert_id) != ALERT_ID_DIGEST_SIZE * 2]:
+                alert = alerts[old_id]
+                try:
+                    new_id = self.get_alert_id(alert["server"], alert["hostname"], alert["type"])
+                except KeyError:
+                    continue
+                alerts[new_id] = alerts.pop(old_id)
+                self._mark_dirty(old_id)
+                self._mark_dirty(new_id)
+                migrated += 1
+        if migrated:
+            logger.info(f"Migrated {migrated} alerts to new alert IDs")
     
     def save_alert_status(self):
-        """Save the alert status to file."""
-        with open(ALERT_STATUS_FILE, 'w') as f:
-            json.dump(self.alert_status, f, indent=2)
+        """Write the alerts changed since the last save to the database.
+
+        Each changed alert is upserted into the table for its current state and
+        removed from the other, all in a single transaction. Alerts whose
+        serialized data matches what was last written are skipped, and no
+        transaction is opened when nothing differs.
+        """
+        active = self.alert_status["active_alerts"]
+        resolved = self.alert_status["resolved_alerts"]
+        
+        upserts = []
+        deletes = []
+        for alert_id in self._dirty_ids:
+            if alert_id in active:
+                upsert_table, delete_table, alert = "active_alerts", "resolved_alerts", active[alert_id]
+            elif alert_id in resolved:
+                upsert_table, delete_table, alert = "resolved_alerts", "active_alerts", resolved[alert_id]
+            else:
+                if self._saved_rows.pop(alert_id, None) is not None:
+                    deletes.append(alert_id)
+                continue
+            row = (upsert_table, json_dumps(_encode_alert(alert), indent=False).decode('utf-8'))
+            if self._saved_rows.get(alert_id) != row:
+                upserts.append((alert_id, row, delete_table))
+        
+        if upserts or deletes:
+            with self._db:
+                self._db.execute("BEGIN")
+                for alert_id in deletes:
+                    self._db.execute("DELETE FROM active_alerts WHERE id = ?", (alert_id,))
+                    self._db.execute("DELETE FROM resolved_alerts WHERE id = ?", (alert_id,))
+                for alert_id, (upsert_table, data), delete_table in upserts:
+                    self._db.execute(f"INSERT OR REPLACE INTO {upsert_table} (id, data) VALUES (?, ?)",
+                                     (alert_id, data))
+                    self._db.execute(f"DELETE FROM {delete_table} WHERE id = ?", (alert_id,))
+            for alert_id, row, delete_table in upserts:
+                self._saved_rows[alert_id] = row
+        
+        self._dirty = False
+        self._dirty_ids = set()
+        self._last_flush_ts = time.time()
+    
+    @_synchronized
+    def maybe_flush(self, force=False):
+        """Save the alert status if it has unsaved changes and is due for a flush."""
+        if not self._dirty:
+            return
+        if force or time.time() - self._last_flush_ts >= ALERT_STATUS_FLUSH_INTERVAL:
+            self.save_alert_status()
+    
+    def close(self):
+        """Flush any unsaved alert status changes. Registered to run at exit."""
+        self.maybe_flush(force=True)
+        try:
+            self._drain_deferred_emails()
+        finally:
+            self._close_smtp()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
     
+    @_synchronized
     def start_session(self):
         """Start a new alert collection session."""
         self.session_active = True
-        self.session_new_alerts = []
-        self.session_resolved_alerts = []
-        self.session_recurring_alerts = []
+        self.session_new_alerts.clear()
+        self.session_resolved_alerts.clear()
+        self.session_recurring_alerts.clear()
+        self._seen_this_tick.clear()
+        self._open_alerts_cache = {}
         logger.debug("Started new alert session")
     
+    @_synchronized
     def end_session(self):
         """End the alert session and send batch notifications."""
         logger.info("end_session() called")
@@ -69,51 +666,74 @@ class AlertManager:
             return
 
         self.session_active = False
+
+        # Fast path for a healthy tick: nothing queued, only persist state
+        if not (self.session_new_alerts or self.session_resolved_alerts or self.session_recurring_alerts):
+            if self._deferred_emails:
+                try:
+                    self._send_deferred_emails()
+                finally:
+                    self._close_smtp()
+            self.maybe_flush(force=True)
+            self._seen_this_tick.clear()
+            self._open_alerts_cache = {}
+            logger.debug("Ended alert session with nothing to send")
+            return
+
         logger.info(f"Ending alert session - New: {len(self.session_new_alerts)}, Resolved: {len(self.session_resolved_alerts)}, Recurring: {len(self.session_recurring_alerts)}")
 
-        # Send batch notifications
+        # Send batch notifications, all stamped with the same time
         notifications_sent = False
+        now = datetime.now().replace(microsecond=0)
+        now_str = now.strftime(TIMESTAMP_FORMAT)
 
-        # Send new/recurring alerts together
-        if self.session_new_alerts or self.session_recurring_alerts:
-            logger.info("Sending batch alerts (new/recurring)")
-            if self._send_batch_alerts():
-                notifications_sent = True
-            logger.info("Finished sending batch alerts")
+        try:
+            # Send new/recurring alerts together
+            if self.session_new_alerts or self.session_recurring_alerts:
+                logger.info("Sending batch alerts (new/recurring)")
+                if self._send_batch_alerts(now_str):
+                    notifications_sent = True
+                logger.info("Finished sending batch alerts")
 
-        # Send resolved alerts
-        if self.session_resolved_alerts:
-            logger.info("Sending batch resolutions")
-            if self._send_batch_resolutions():
-                notifications_sent = True
-            logger.info("Finished sending batch resolutions")
+            # Send resolved alerts
+            if self.session_resolved_alerts:
+                logger.info("Sending batch resolutions")
+                if self._send_batch_resolutions(now_str):
+                    notifications_sent = True
+                logger.info("Finished sending batch resolutions")
+
+            # Catch up on emails held back by the rate limit
+            self._send_deferred_emails()
+        finally:
+            # Release the SMTP connection shared by this session's emails
+            self._close_smtp()
 
         # Reset cooldown for all active alerts if we sent any notifications
         if notifications_sent:
             logger.info("Resetting cooldowns for active alerts")
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.reset_all_alert_cooldowns(now_str)
-            self.save_alert_status()
+            self.reset_all_alert_cooldowns(now)
             logger.info("Reset cooldown for all active alerts after sending batch notifications")
 
+        # Persist all alert state changes from this session in one write
+        self.maybe_flush(force=True)
+
         # Clear session data
         logger.info("Clearing session data")
         self.session_new_alerts = []
         self.session_resolved_alerts = []
         self.session_recurring_alerts = []
+        self._seen_this_tick = set()
+        self._open_alerts_cache = {}
         logger.info("end_session() completed")
     
-    def get_open_alerts(self):
-        """Get a list of all currently open alerts."""
+    def get_open_alerts(self, exclude_alert_id=None):
+        """Get a list of all currently open alerts, optionally skipping one."""
         open_alerts = []
         for alert_id, alert in self.alert_status["active_alerts"].items():
+            if alert_id == exclude_alert_id:
+                continue
             # Calculate duration
-            first_detected = datetime.strptime(alert["first_detected"], "%Y-%m-%d %H:%M:%S")
-            now = datetime.now()
-            duration = now - first_detected
-            hours, remainder = divmod(duration.seconds, 3600)
-            minutes, _ = divmod(remainder, 60)
-            duration_str = f"{duration.days} days, {hours} hours" if duration.days > 0 else f"{hours} hours, {minutes} minutes"
+            duration_str = format_duration(datetime.now() - alert["first_detected"])
             
             open_alerts.append({
                 "server": alert["server"],
@@ -128,104 +748,220 @@ class AlertManager:
     
     def format_open_alerts_html(self, exclude_alert_id=None):
         """Format open alerts as HTML table for email."""
-        open_alerts = self.get_open_alerts()
-        
+        return self._cached_open_alerts("html", exclude_alert_id, self._render_open_alerts_html)
+    
+    def format_open_alerts_text(self, exclude_alert_id=None):
+        """Format open alerts as plain text for Telegram."""
+        return self._cached_open_alerts("text", exclude_alert_id, self._render_open_alerts_text)
+    
+    def _cached_open_alerts(self, kind, exclude_alert_id, render):
+        """Return a rendered open alerts section, reusing it until active alerts change."""
+        key = (kind, exclude_alert_id)
+        if key not in self._open_alerts_cache:
+            self._open_alerts_cache[key] = render(exclude_alert_id)
+        return self._open_alerts_cache[key]
+    
+    def _render_open_alerts_html(self, exclude_alert_id=None):
+        """Render open alerts as HTML table for email."""
         # Exclude current alert if specified (for resolution messages)
-        if exclude_alert_id:
-            excluded_alert = self.alert_status["active_alerts"].get(exclude_alert_id)
-            if excluded_alert:
-                open_alerts = [alert for alert in open_alerts if not (
-                    alert["server"] == excluded_alert["server"] and 
-                    alert["hostname"] == excluded_alert["hostname"] and 
-                    alert["type"] == excluded_alert["type"]
-                )]
+        open_alerts = self.get_open_alerts(exclude_alert_id)
         
         if not open_alerts:
             return "<p style='color: #48c774; font-style: italic;'>No other open alerts.</p>"
         
-        html = """
-        <div class="open-alerts">
-            <h3 style="color: #333; margin: 20px 0 10px 0;">Other Open Alerts:</h3>
-            <table style="width: 100%; border-collapse: collapse; margin-bottom: 20px;">
-                <thead>
-                    <tr style="background-color: #f5f5f5;">
-                        <th style="padding: 8px; text-align: left; border-bottom: 1px solid #ddd;">Server</th>
-                        <th style="padding: 8px; text-align: left; border-bottom: 1px solid #ddd;">Issue</th>
-                        <th style="padding: 8px; text-align: left; border-bottom: 1px solid #ddd;">Duration</th>
-                    </tr>
-                </thead>
-                <tbody>
-        """
-        
+        parts = [OPEN_ALERTS_TABLE_HEADER]
         for alert in open_alerts:
-            html += f"""
-                    <tr>
-                        <td style="padding: 8px; border-bottom: 1px solid #eee; font-family: monospace;">{alert["server"]}</td>
-                        <td style="padding: 8px; border-bottom: 1px solid #eee;">{alert["message"]}</td>
-                        <td style="padding: 8px; border-bottom: 1px solid #eee;">{alert["duration"]}</td>
-                    </tr>
-            """
-        
-        html += """
-                </tbody>
-            </table>
-        </div>
-        """
+            parts.append(OPEN_ALERTS_TABLE_ROW.format(
+                server=html_escape(alert["server"]),
+                message=html_escape(alert["message"]),
+                duration=alert["duration"]
+            ))
+        parts.append(OPEN_ALERTS_TABLE_FOOTER)
         
-        return html
+        return "".join(parts)
     
-    def format_open_alerts_text(self, exclude_alert_id=None):
-        """Format open alerts as plain text for Telegram."""
-        open_alerts = self.get_open_alerts()
-        
+    def _render_open_alerts_text(self, exclude_alert_id=None):
+        """Render open alerts as plain text for Telegram."""
         # Exclude current alert if specified (for resolution messages)
-        if exclude_alert_id:
-            excluded_alert = self.alert_status["active_alerts"].get(exclude_alert_id)
-            if excluded_alert:
-                open_alerts = [alert for alert in open_alerts if not (
-                    alert["server"] == excluded_alert["server"] and 
-                    alert["hostname"] == excluded_alert["hostname"] and 
-                    alert["type"] == excluded_alert["type"]
-                )]
+        open_alerts = self.get_open_alerts(exclude_alert_id)
         
         if not open_alerts:
             return "\n\n<i>No other open alerts.</i>"
         
-        text = "\n\n<b>Other Open Alerts:</b>\n"
+        lines = ["\n\n<b>Other Open Alerts:</b>\n"]
         for alert in open_alerts:
-            text += f"• <b>{alert['server']}</b> ({alert['hostname']}): {alert['message']} - Duration: {alert['duration']}\n"
+            lines.append(f"• <b>{alert['server']}</b> ({alert['hostname']}): {alert['message']} - Duration: {alert['duration']}\n")
         
-        return text
+        return "".join(lines)
     
-    def reset_all_alert_cooldowns(self, current_time_str):
+    def reset_all_alert_cooldowns(self, current_time):
         """Reset the last_notified timestamp for all active alerts."""
-        for alert_id in self.alert_status["active_alerts"]:
-            self.alert_status["active_alerts"][alert_id]["last_notified"] = current_time_str
-        logger.debug(f"Reset cooldown for {len(self.alert_status['active_alerts'])} active alerts")
+        active = self.alert_status["active_alerts"]
+        for alert in active.values():
+            alert["last_notified"] = current_time
+        self._mark_dirty(*active)
+        current_ts = current_time.timestamp()
+        self._next_notify_ts = {alert_id: current_ts + self._cooldown_seconds(alert)
+                                for alert_id, alert in active.items()}
+        logger.debug(f"Reset cooldown for {len(active)} active alerts")
+    
+    def _cooldown_hours(self, alert):
+        """Return an alert's cooldown in hours, doubling with each repeat notification."""
+        hours = self._alert_cooldown_hours * 2 ** (alert.get("notify_count", 1) - 1)
+        return min(hours, self._alert_cooldown_max_hours)
+    
+    def _cooldown_seconds(self, alert):
+        """Return an alert's cooldown in seconds."""
+        return self._cooldown_hours(alert) * 3600
     
-    def get_alert_id(self, nickname, hostname, alert_type):
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def get_alert_id(nickname, hostname, alert_type):
         """Generate a unique ID for an alert."""
         alert_string = f"{nickname}:{hostname}:{alert_type}"
-        return hashlib.md5(alert_string.encode()).hexdigest()
+        return hashlib.blake2b(alert_string.encode(), digest_size=ALERT_ID_DIGEST_SIZE).hexdigest()
+    
+    def _new_email_message(self):
+        """Return a fresh alert message with the From/To headers already set."""
+        if self._msg_template is None:
+            from email.mime.multipart import MIMEMultipart
+            self._msg_template = MIMEMultipart('related')
+            self._msg_template['From'] = self._email_from
+            self._msg_template['To'] = self._email_to_str
+        return copy.deepcopy(self._msg_template)
+    
+    def _get_smtp(self):
+        """Return a live SMTP connection, opening (or reopening) it as needed."""
+        import smtplib
+        if self._smtp is not None and self._smtp_sends >= SMTP_MAX_REUSE:
+            self._close_smtp()
+        
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self._close_smtp()
+            except (smtplib.SMTPException, OSError):
+                self._close_smtp()
+        
+        if self._smtp is None:
+            server = smtplib.SMTP(self._smtp_host, self._smtp_port)
+            if self._smtp_tls:
+                server.starttls()
+            if self._smtp_user and self._smtp_pass:
+                server.login(self._smtp_user, self._smtp_pass)
+            self._smtp = server
+            self._smtp_sends = 0
+        return self._smtp
+    
+    def _close_smtp(self):
+        """Close the pooled SMTP connection, if any."""
+        if self._smtp is None:
+            return
+        import smtplib
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+        self._smtp_sends = 0
+    
+    def _smtp_send(self, msg):
+        """Send a message to all recipients over the pooled SMTP connection.
+
+        The message is serialized once and delivered in a single transaction.
+        When the send rate limit is reached it is deferred to a later run and
+        False is returned, so callers do not count it as sent.
+        """
+        data = msg.as_bytes()
+        self._send_deferred_emails()
+        if self._deferred_emails or not self._take_email_token():
+            logger.warning("SMTP send rate limit reached, deferring email to the next check run")
+            self._deferred_emails.append(data)
+            return False
+        self._smtp_deliver(data)
+        return True
+    
+    def _smtp_deliver(self, data):
+        """Deliver a serialized message, reconnecting once if the connection dropped."""
+        import smtplib
+        try:
+            self._get_smtp().sendmail(self._email_from, self._email_recipients, data)
+        except smtplib.SMTPServerDisconnected:
+            self._close_smtp()
+            self._get_smtp().sendmail(self._email_from, self._email_recipients, data)
+        self._smtp_sends += 1
     
+    def _take_email_token(self):
+        """Take a token from the SMTP rate limit bucket, returning False if none is left."""
+        if self._email_rate is None:
+            return True
+        now = time.monotonic()
+        bucket = self._bucket
+        bucket["tokens"] = min(self._email_burst, bucket["tokens"] + (now - bucket["last"]) * self._email_rate)
+        bucket["last"] = now
+        if bucket["tokens"] < 1:
+            return False
+        bucket["tokens"] -= 1
+        return True
+    
+    def _send_deferred_emails(self):
+        """Send emails held back by the rate limit while the bucket has tokens."""
+        while self._deferred_emails and self._take_email_token():
+            data = self._deferred_emails[0]
+            try:
+                self._smtp_deliver(data)
+            except Exception as e:
+                logger.error(f"Failed to send deferred email: {str(e)}")
+                return
+            self._deferred_emails.pop(0)
+        if self._deferred_emails:
+            logger.info(f"{len(self._deferred_emails)} email(s) still deferred by the SMTP rate limit")
+    
+    def _drain_deferred_emails(self):
+        """Send every deferred email before exit, waiting for the rate limit to refill."""
+        while self._deferred_emails:
+            if not self._take_email_token():
+                time.sleep((1 - self._bucket["tokens"]) / self._email_rate)
+                continue
+            try:
+                self._smtp_deliver(self._deferred_emails[0])
+            except Exception as e:
+                logger.error(f"Failed to send deferred email: {str(e)}")
+                break
+            self._deferred_emails.pop(0)
+        if self._deferred_emails:
+            logger.error(f"Dropping {len(self._deferred_emails)} deferred email(s) that could not be sent before exit")
+            self._deferred_emails.clear()
+    
+    def _attach_html(self, msg, html):
+        """Attach the HTML body and, when available, the inline logo to a message."""
+        from email.mime.text import MIMEText
+        msg.attach(MIMEText(html, 'html'))
+        if self._logo_part is not None:
+            msg.attach(copy.deepcopy(self._logo_part))
+    
+    @_synchronized
     def send_alert(self, nickname, hostname, message, alert_type=None):
         """Send an alert email with rate limiting and resolution tracking."""
         # Extract alert type from message if not provided
         if not alert_type:
             alert_type = message.split()[0].lower()
         
+        # Coalesce duplicate alerts raised within the same session
+        alert_id = self.get_alert_id(nickname, hostname, alert_type)
+        if self.session_active:
+            if alert_id in self._seen_this_tick:
+                logger.debug(f"Duplicate alert {alert_id} for {nickname} in session, skipping")
+                return True
+            self._seen_this_tick.add(alert_id)
+        
         # Log to file
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        os.makedirs('logs', exist_ok=True)
-        with open("logs/alerts.log", "a") as log:
-            log.write(f"[{timestamp}] {nickname} ({hostname}): {message}\n")
+        _get_alert_file_logger().info("%s (%s): %s", nickname, hostname, message)
         
         logger.warning(f"Alert for {nickname} ({hostname}): {message}")
         
-        # Generate alert ID and get current time
-        alert_id = self.get_alert_id(nickname, hostname, alert_type)
-        now = datetime.now()
-        now_str = now.strftime("%Y-%m-%d %H:%M:%S")
+        # Get current time
+        now = datetime.now().replace(microsecond=0)
         
         # Check if this is a new alert
         is_new_alert = alert_id not in self.alert_status["active_alerts"]
@@ -241,48 +977,53 @@ class AlertManager:
                 "hostname": hostname,
                 "type": alert_type,
                 "message": message,
-                "first_detected": now_str,
-                "last_detected": now_str,
-                "last_notified": now_str
+                "first_detected": now,
+                "last_detected": now,
+                "last_notified": now,
+                "notify_count": 1
             }
             should_send_email = True
+            self._next_notify_ts[alert_id] = now.timestamp() + self._cooldown_seconds(self.alert_status["active_alerts"][alert_id])
             
             # If it was previously resolved, move it from resolved to active
             if is_recurring:
                 del self.alert_status["resolved_alerts"][alert_id]
         else:
             # Existing alert, update timestamp
-            self.alert_status["active_alerts"][alert_id]["last_detected"] = now_str
+            alert = self.alert_status["active_alerts"][alert_id]
+            alert["last_detected"] = now
             
-            # Check if we should send another notification (rate limiting)
-            last_notified = datetime.strptime(
-                self.alert_status["active_alerts"][alert_id]["last_notified"],
-                "%Y-%m-%d %H:%M:%S"
-            )
+            # Check if we should send another notification (rate limiting).
+            # The next allowed notification time is cached per alert so the
+            # common "still cooling down" case is a single float compare.
+            now_ts = now.timestamp()
+            next_notify_ts = self._next_notify_ts.get(alert_id)
+            if next_notify_ts is None:
+                next_notify_ts = alert["last_notified"].timestamp() + self._cooldown_seconds(alert)
+                self._next_notify_ts[alert_id] = next_notify_ts
             
-            hours_since_last_notification = (now - last_notified).total_seconds() / 3600
-            
-            # Use the configurable alert_cooldown from config
-            alert_cooldown = self.config.get('alert_cooldown', 1)  # Default to 1 hour if not configured
-            
-            if hours_since_last_notification >= alert_cooldown:
+            if now_ts >= next_notify_ts:
                 should_send_email = True
-                self.alert_status["active_alerts"][alert_id]["last_notified"] = now_str
-        
-        # Save updated alert status
-        self.save_alert_status()
-        
-        # If we're in a session, queue the alert instead of sending immediately
-        if self.session_active and should_send_email:
-            alert_data = {
-                "server": nickname,
-                "hostname": hostname,
-                "message": message,
-                "type": alert_type,
-                "alert_id": alert_id,
-                "is_new": is_new_alert,
-                "is_recurring": is_recurring
-            }
+                alert["last_notified"] = now
+                alert["notify_count"] = alert.get("notify_count", 1) + 1
+                self._next_notify_ts[alert_id] = now_ts + self._cooldown_seconds(alert)
+        
+        # Save updated alert status. Within a session the write is deferred to
+        # end_session(); outside one only plain last_detected refreshes are.
+        self._mark_dirty(alert_id)
+        self.maybe_flush(force=should_send_email and not self.session_active)
+        
+        # If we're in a session, queue the alert instead of sending immediately
+        if self.session_active and should_send_email:
+            alert_data = SessionAlert(
+                server=nickname,
+                hostname=hostname,
+                message=message,
+                type=alert_type,
+                alert_id=alert_id,
+                is_new=is_new_alert,
+                is_recurring=is_recurring
+            )
             
             if is_new_alert:
                 self.session_new_alerts.append(alert_data)
@@ -293,23 +1034,23 @@ class AlertManager:
             return True
         
         # Original immediate notification logic (for non-session mode)
-        alert_cooldown = self.config.get('alert_cooldown', 1)
+        alert_cooldown = self._cooldown_hours(self.alert_status["active_alerts"][alert_id])
         email_sent = False
         telegram_sent = False
         
         if should_send_email and not self.session_active:
             # Send email if enabled
-            if self.config and self.config.get('email', {}).get('enabled', False):
-                email_sent = self._send_email_alert(nickname, hostname, message, is_new_alert, alert_cooldown)
+            if self._email_enabled:
+                email_sent = self._send_email_alert(nickname, hostname, message, is_new_alert, alert_cooldown, now)
             
             # Send Telegram if enabled
-            if self.telegram_bot.is_configured():
+            if self._telegram_enabled:
                 open_alerts_text = self.format_open_alerts_text()
                 telegram_sent = self.telegram_bot.send_alert_to_all(nickname, hostname, message, is_new_alert, open_alerts_text)
             
             # If we sent a notification (NEW or RECURRING), reset cooldown for ALL active alerts
             if email_sent or telegram_sent:
-                self.reset_all_alert_cooldowns(now_str)
+                self.reset_all_alert_cooldowns(now)
                 self.save_alert_status()  # Save the updated timestamps
                 logger.info(f"Reset cooldown for all active alerts after sending {'NEW' if is_new_alert else 'RECURRING'} alert")
         
@@ -321,6 +1062,7 @@ class AlertManager:
         
         return email_sent or telegram_sent or self.session_active
     
+    @_synchronized
     def check_alert_resolution(self, nickname, hostname, metric, current_value, threshold):
         """Check if an alert has been resolved."""
         alert_id = self.get_alert_id(nickname, hostname, metric.lower())
@@ -332,22 +1074,20 @@ class AlertManager:
             if current_value < threshold:
                 # Alert is resolved
                 alert = self.alert_status["active_alerts"].pop(alert_id)
-                alert["resolved_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self._next_notify_ts.pop(alert_id, None)
+                resolved_time = datetime.now().replace(microsecond=0)
+                alert["resolved_time"] = resolved_time
                 self.alert_status["resolved_alerts"][alert_id] = alert
+                self._mark_dirty(alert_id)
                 
-                # Save updated status
-                self.save_alert_status()
+                # Save updated status (deferred to end_session() within a session)
+                self.maybe_flush(force=not self.session_active)
                 
                 # Log resolution
                 logger.info(f"{nickname} ({hostname}): {metric} alert resolved - now at {current_value:.1f}%, below threshold of {threshold}%")
                 
                 # Calculate duration
-                first_detected = datetime.strptime(alert["first_detected"], "%Y-%m-%d %H:%M:%S")
-                resolved_time = datetime.strptime(alert["resolved_time"], "%Y-%m-%d %H:%M:%S")
-                duration = resolved_time - first_detected
-                hours, remainder = divmod(duration.seconds, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                duration_str = f"{duration.days} days, {hours} hours, {minutes} minutes" if duration.days > 0 else f"{hours} hours, {minutes} minutes"
+                duration_str = format_duration(resolved_time - alert["first_detected"], detailed=True)
                 
                 # If we're in a session, queue the resolution
                 if self.session_active:
@@ -369,10 +1109,10 @@ class AlertManager:
                 email_sent = False
                 telegram_sent = False
                 
-                if self.config and self.config.get('email', {}).get('enabled', False):
-                    email_sent = self._send_resolution_email(nickname, hostname, metric, current_value, threshold, alert, alert_id)
+                if self._email_enabled:
+                    email_sent = self._send_resolution_email(nickname, hostname, metric, current_value, threshold, alert, alert_id, duration_str)
                 
-                if self.telegram_bot.is_configured():
+                if self._telegram_enabled:
                     telegram_sent = self.telegram_bot.send_resolution_to_all(nickname, hostname, metric, current_value, threshold, duration_str, self.format_open_alerts_text(alert_id))
                 
                 # If we sent resolution notifications, reset cooldown for ALL remaining active alerts
@@ -388,12 +1128,10 @@ class AlertManager:
             logger.debug(f"No active alert found for {alert_id}")
         return False
     
-    def _send_email_alert(self, nickname, hostname, message, is_new_alert, alert_cooldown):
+    def _send_email_alert(self, nickname, hostname, message, is_new_alert, alert_cooldown, detected):
         """Send an alert email."""
         try:
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.config['email']['sender']
-            msg['To'] = ", ".join(self.config['email']['recipients'])
+            msg = self._new_email_message()
             
             # Set subject based on whether it's new or recurring
             subject_prefix = "NEW ALERT" if is_new_alert else "RECURRING ALERT"
@@ -402,67 +1140,22 @@ class AlertManager:
             # Get open alerts for inclusion in the email
             open_alerts_html = self.format_open_alerts_html()
             
-            # Create HTML version of the message with logo from GitHub URL
-            html = f"""
-            <html>
-              <head>
-                <style>
-                  body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; background-color: #f9f9f9; margin: 0; padding: 0; }}
-                  .container {{ max-width: 600px; margin: 20px auto; padding: 20px; background-color: #fff; border-radius: 5px; border-top: 5px solid #ff3860; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1); }}
-                  h1 {{ color: #ff3860; margin-top: 0; }}
-                  .logo {{ text-align: center; margin-bottom: 20px; }}
-                  .logo img {{ width: 150px; height: auto; }}
-                  .server-info {{ background-color: #f5f5f5; padding: 15px; border-radius: 4px; margin: 20px 0; }}
-                  .server-name {{ font-size: 18px; font-weight: bold; color: #333; }}
-                  .server-hostname {{ color: #777; font-family: monospace; }}
-                  .alert-message {{ font-size: 18px; color: #ff3860; background-color: #ffeeee; padding: 10px; border-radius: 4px; margin: 15px 0; }}
-                  .timestamp {{ color: #777; font-size: 14px; margin-top: 20px; }}
-                  .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #777; }}
-                  .open-alerts {{ margin: 20px 0; padding: 15px; background-color: #f8f9fa; border-radius: 4px; border-left: 4px solid #ffc107; }}
-                </style>
-              </head>
-              <body>
-                <div class="container">
-                  <div class="logo">
-                    <img src="https://raw.githubusercontent.com/bnesim/heimdall-monitoring/refs/heads/main/HEIMDALL.png" alt="Heimdall Logo">
-                  </div>
-                  <h1>⚠️ Heimdall Server Alert ⚠️</h1>
-                  <p>Heimdall has detected an issue that requires your attention.</p>
-                  
-                  <div class="server-info">
-                    <div class="server-name">{nickname}</div>
-                    <div class="server-hostname">{hostname}</div>
-                  </div>
-                  
-                  <div class="alert-message">
-                    {message.replace(chr(10), '<br>')}
-                  </div>
-                  
-                  <div class="timestamp">
-                    Detected: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-                  </div>
-                  
-                  {open_alerts_html}
-                  
-                  <div class="footer">
-                    This is an automated message from Heimdall, the all-seeing guardian of your servers.
-                    <br>You will not receive another notification about this issue for at least {alert_cooldown} hour(s).
-                  </div>
-                </div>
-              </body>
-            </html>
-            """
+            # Create HTML version of the message
+            html = ALERT_EMAIL_TEMPLATE.format_map({
+                "logo_src": self._logo_src,
+                "nickname": html_escape(nickname),
+                "hostname": html_escape(hostname),
+                "message_html": _html_text(message),
+                "detected": detected.strftime(TIMESTAMP_FORMAT),
+                "open_alerts_html": open_alerts_html,
+                "alert_cooldown": alert_cooldown
+            })
             
-            msg.attach(MIMEText(html, 'html'))
+            self._attach_html(msg, html)
             
-            # Send the email
-            with smtplib.SMTP(self.config['email']['smtp_server'], 
-                            self.config['email']['smtp_port']) as server:
-                if self.config['email']['use_tls']:
-                    server.starttls()
-                server.login(self.config['email']['username'],
-                           self.config['email']['password'])
-                server.send_message(msg)
+            # Send the email, unless the rate limit deferred it
+            if not self._smtp_send(msg):
+                return False
             
             logger.info(f"Alert email sent to {msg['To']}")
             return True
@@ -470,102 +1163,38 @@ class AlertManager:
             logger.error(f"Failed to send alert email: {str(e)}")
             return False
     
-    def _send_resolution_email(self, nickname, hostname, metric, current_value, threshold, alert_info, alert_id=None):
+    def _send_resolution_email(self, nickname, hostname, metric, current_value, threshold, alert_info, alert_id=None, duration_str=None):
         """Send an alert resolution email."""
         try:
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.config['email']['sender']
-            msg['To'] = ", ".join(self.config['email']['recipients'])
+            msg = self._new_email_message()
             msg['Subject'] = f"HEIMDALL RESOLVED: {nickname} - {metric} issue resolved"
             
-            # Calculate problem duration
-            first_detected = datetime.strptime(alert_info["first_detected"], "%Y-%m-%d %H:%M:%S")
-            resolved_time = datetime.strptime(alert_info["resolved_time"], "%Y-%m-%d %H:%M:%S")
-            duration = resolved_time - first_detected
-            hours, remainder = divmod(duration.seconds, 3600)
-            minutes, seconds = divmod(remainder, 60)
-            duration_str = f"{duration.days} days, {hours} hours, {minutes} minutes" if duration.days > 0 else f"{hours} hours, {minutes} minutes"
+            # Calculate problem duration unless the caller already did
+            if duration_str is None:
+                duration_str = format_duration(alert_info["resolved_time"] - alert_info["first_detected"], detailed=True)
             
             # Get open alerts for inclusion in the email (excluding the one being resolved)
             open_alerts_html = self.format_open_alerts_html(alert_id)
             
-            # Create HTML version of the message with logo from GitHub URL
-            html = f"""
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; background-color: #f9f9f9; margin: 0; padding: 0; }}
-                    .container {{ max-width: 600px; margin: 20px auto; padding: 20px; background-color: #fff; border-radius: 5px; border-top: 5px solid #48c774; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1); }}
-                    h1 {{ color: #48c774; margin-top: 0; }}
-                    .logo {{ text-align: center; margin-bottom: 20px; }}
-                    .logo img {{ width: 150px; height: auto; }}
-                    .server-info {{ background-color: #f5f5f5; padding: 15px; border-radius: 4px; margin: 20px 0; }}
-                    .server-name {{ font-size: 18px; font-weight: bold; color: #333; }}
-                    .server-hostname {{ color: #777; font-family: monospace; }}
-                    .resolve-message {{ font-size: 18px; color: #48c774; background-color: #effaf5; padding: 10px; border-radius: 4px; margin: 15px 0; }}
-                    .alert-details {{ background-color: #f5f5f5; padding: 12px; border-radius: 4px; margin: 15px 0; font-size: 14px; }}
-                    .detail-row {{ display: flex; justify-content: space-between; margin-bottom: 5px; border-bottom: 1px solid #eee; padding-bottom: 5px; }}
-                    .detail-label {{ font-weight: bold; }}
-                    .timestamp {{ color: #777; font-size: 14px; margin-top: 20px; }}
-                    .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #777; }}
-                    .open-alerts {{ margin: 20px 0; padding: 15px; background-color: #f8f9fa; border-radius: 4px; border-left: 4px solid #ffc107; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="logo">
-                        <img src="https://raw.githubusercontent.com/bnesim/heimdall-monitoring/refs/heads/main/HEIMDALL.png" alt="Heimdall Logo">
-                    </div>
-                    <h1>✅ Alert Resolved</h1>
-                    <p>Heimdall has detected that a previous alert has been resolved.</p>
-                    
-                    <div class="server-info">
-                        <div class="server-name">{nickname}</div>
-                        <div class="server-hostname">{hostname}</div>
-                    </div>
-                    
-                    <div class="resolve-message">
-                        {metric} usage has returned to normal levels: {current_value:.1f}% (threshold: {threshold}%)
-                    </div>
-                    
-                    <div class="alert-details">
-                        <div class="detail-row">
-                            <span class="detail-label">First Detected:</span>
-                            <span>{alert_info["first_detected"]}</span>
-                        </div>
-                        <div class="detail-row">
-                            <span class="detail-label">Resolved:</span>
-                            <span>{alert_info["resolved_time"]}</span>
-                        </div>
-                        <div class="detail-row">
-                            <span class="detail-label">Duration:</span>
-                            <span>{duration_str}</span>
-                        </div>
-                        <div class="detail-row">
-                            <span class="detail-label">Original Issue:</span>
-                            <span>{alert_info["message"]}</span>
-                        </div>
-                    </div>
-                    
-                    {open_alerts_html}
-                    
-                    <div class="footer">
-                        This is an automated message from Heimdall, the all-seeing guardian of your servers.
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
+            # Create HTML version of the message
+            html = RESOLUTION_EMAIL_TEMPLATE.format_map({
+                "logo_src": self._logo_src,
+                "nickname": html_escape(nickname),
+                "hostname": html_escape(hostname),
+                "metric": html_escape(metric),
+                "current_value": current_value,
+                "threshold": threshold,
+                "first_detected": alert_info["first_detected"].strftime(TIMESTAMP_FORMAT),
+                "resolved_time": alert_info["resolved_time"].strftime(TIMESTAMP_FORMAT),
+                "duration_str": duration_str,
+                "original_message": _html_text(alert_info["message"]),
+                "open_alerts_html": open_alerts_html
+            })
             
-            msg.attach(MIMEText(html, 'html'))
+            self._attach_html(msg, html)
             
-            with smtplib.SMTP(self.config['email']['smtp_server'], 
-                            self.config['email']['smtp_port']) as server:
-                if self.config['email']['use_tls']:
-                    server.starttls()
-                server.login(self.config['email']['username'],
-                           self.config['email']['password'])
-                server.send_message(msg)
+            if not self._smtp_send(msg):
+                return False
             
             logger.info(f"Resolution email sent to {msg['To']}")
             return True
@@ -575,10 +1204,12 @@ class AlertManager:
             
     def send_test_email(self):
         """Send a test email to verify SMTP settings."""
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
         try:
             msg = MIMEMultipart()
-            msg['From'] = self.config['email']['sender']
-            msg['To'] = ", ".join(self.config['email']['recipients'])
+            msg['From'] = self._email_from
+            msg['To'] = self._email_to_str
             msg['Subject'] = "HEIMDALL TEST EMAIL"
             
             body = f'''
@@ -591,17 +1222,11 @@ class AlertManager:
             
             msg.attach(MIMEText(body, 'plain'))
             
-            # Connect to SMTP server and send email
-            server = smtplib.SMTP(self.config['email']['smtp_server'], self.config['email']['smtp_port'])
-            
-            if self.config['email']['use_tls']:
-                server.starttls()
-            
-            if self.config['email']['username'] and self.config['email']['password']:
-                server.login(self.config['email']['username'], self.config['email']['password'])
-            
-            server.send_message(msg)
-            server.quit()
+            # Connect to SMTP server and send email, bypassing the rate limit
+            try:
+                self._smtp_deliver(msg.as_bytes())
+            finally:
+                self._close_smtp()
             
             logger.info("Test email sent successfully")
             return True
@@ -611,7 +1236,7 @@ class AlertManager:
     
     def send_test_telegram(self):
         """Send a test message to all Telegram subscribers."""
-        if not self.telegram_bot.is_configured():
+        if not self._telegram_enabled:
             logger.error("Telegram bot is not configured")
             return False
         
@@ -624,15 +1249,13 @@ This is a test message from Heimdall Monitoring System.
 
 If you're receiving this, your Telegram configuration is working correctly!"""
         
-        sent_count = 0
-        for subscriber in self.telegram_bot.subscribers:
-            if self.telegram_bot.send_message(subscriber['chat_id'], test_message):
-                sent_count += 1
+        results = self.telegram_bot.send_to_subscribers(self.telegram_bot.subscribers, test_message)
+        sent_count = sum(1 for _, sent in results if sent)
         
         logger.info(f"Test message sent to {sent_count}/{len(self.telegram_bot.subscribers)} Telegram subscribers")
         return sent_count > 0
     
-    def _send_batch_alerts(self):
+    def _send_batch_alerts(self, now_str):
         """Send batch email and Telegram for all queued alerts."""
         logger.info("_send_batch_alerts() called")
         if not self.session_new_alerts and not self.session_recurring_alerts:
@@ -640,45 +1263,51 @@ If you're receiving this, your Telegram configuration is working correctly!"""
             return False
 
         all_alerts = self.session_new_alerts + self.session_recurring_alerts
+        new_count = len(self.session_new_alerts)
+        recurring_count = len(self.session_recurring_alerts)
         logger.info(f"Processing {len(all_alerts)} total alerts")
 
         # Group alerts by server for better organization
         alerts_by_server = {}
         for alert in all_alerts:
-            server_key = f"{alert['server']} ({alert['hostname']})"
+            server_key = f"{alert.server} ({alert.hostname})"
             if server_key not in alerts_by_server:
                 alerts_by_server[server_key] = {"new": [], "recurring": []}
 
-            if alert['is_new']:
+            if alert.is_new:
                 alerts_by_server[server_key]["new"].append(alert)
             else:
                 alerts_by_server[server_key]["recurring"].append(alert)
 
+        # Order servers once for both the email and the Telegram message
+        alerts_by_server = dict(sorted(alerts_by_server.items()))
         logger.info(f"Grouped into {len(alerts_by_server)} servers")
         notifications_sent = False
 
         # Send batch email
-        if self.config and self.config.get('email', {}).get('enabled', False):
+        if self._email_enabled:
             logger.info("Sending batch email alerts")
-            if self._send_batch_email_alerts(alerts_by_server):
+            if self._send_batch_email_alerts(alerts_by_server, new_count, recurring_count, now_str):
                 notifications_sent = True
             logger.info("Finished batch email alerts")
 
         # Send batch Telegram
-        if self.telegram_bot.is_configured():
+        if self._telegram_enabled:
             logger.info("Sending batch Telegram alerts")
-            if self._send_batch_telegram_alerts(alerts_by_server):
+            if self._send_batch_telegram_alerts(alerts_by_server, new_count, recurring_count):
                 notifications_sent = True
             logger.info("Finished batch Telegram alerts")
 
         logger.info(f"_send_batch_alerts() completed - notifications_sent: {notifications_sent}")
         return notifications_sent
     
-    def _send_batch_resolutions(self):
+    def _send_batch_resolutions(self, now_str):
         """Send batch email and Telegram for all resolved alerts."""
         if not self.session_resolved_alerts:
             return False
         
+        total_resolved = len(self.session_resolved_alerts)
+        
         # Group resolutions by server
         resolutions_by_server = {}
         for resolution in self.session_resolved_alerts:
@@ -687,148 +1316,73 @@ If you're receiving this, your Telegram configuration is working correctly!"""
                 resolutions_by_server[server_key] = []
             resolutions_by_server[server_key].append(resolution)
         
+        # Order servers once for both the email and the Telegram message
+        resolutions_by_server = dict(sorted(resolutions_by_server.items()))
+        
         notifications_sent = False
         
         # Send batch email
-        if self.config and self.config.get('email', {}).get('enabled', False):
-            if self._send_batch_resolution_email(resolutions_by_server):
+        if self._email_enabled:
+            if self._send_batch_resolution_email(resolutions_by_server, total_resolved, now_str):
                 notifications_sent = True
         
         # Send batch Telegram
-        if self.telegram_bot.is_configured():
-            if self._send_batch_telegram_resolutions(resolutions_by_server):
+        if self._telegram_enabled:
+            if self._send_batch_telegram_resolutions(resolutions_by_server, total_resolved):
                 notifications_sent = True
         
         return notifications_sent
     
-    def _send_batch_email_alerts(self, alerts_by_server):
+    def _send_batch_email_alerts(self, alerts_by_server, new_count, recurring_count, now_str):
         """Send a single email with all new and recurring alerts."""
         try:
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.config['email']['sender']
-            msg['To'] = ", ".join(self.config['email']['recipients'])
-            
-            # Count alerts
-            new_count = sum(len(alerts["new"]) for alerts in alerts_by_server.values())
-            recurring_count = sum(len(alerts["recurring"]) for alerts in alerts_by_server.values())
+            msg = self._new_email_message()
             
             # Set subject
-            if new_count > 0 and recurring_count > 0:
-                msg['Subject'] = f"HEIMDALL ALERTS: {new_count} new, {recurring_count} recurring issues detected"
-            elif new_count > 0:
-                msg['Subject'] = f"HEIMDALL NEW ALERTS: {new_count} new issues detected"
-            else:
-                msg['Subject'] = f"HEIMDALL RECURRING ALERTS: {recurring_count} issues persist"
+            msg['Subject'] = _batch_alert_subject(new_count, recurring_count)
             
             # Get open alerts for inclusion
             open_alerts_html = self.format_open_alerts_html()
             
             # Build HTML content
-            html = f"""
-            <html>
-              <head>
-                <style>
-                  body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; background-color: #f9f9f9; margin: 0; padding: 0; }}
-                  .container {{ max-width: 800px; margin: 20px auto; padding: 20px; background-color: #fff; border-radius: 5px; border-top: 5px solid #ff3860; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1); }}
-                  h1 {{ color: #ff3860; margin-top: 0; }}
-                  h2 {{ color: #333; margin-top: 30px; border-bottom: 2px solid #eee; padding-bottom: 10px; }}
-                  .logo {{ text-align: center; margin-bottom: 20px; }}
-                  .logo img {{ width: 150px; height: auto; }}
-                  .server-section {{ background-color: #f5f5f5; padding: 15px; border-radius: 4px; margin: 20px 0; }}
-                  .server-name {{ font-size: 18px; font-weight: bold; color: #333; }}
-                  .alert-item {{ margin: 10px 0; padding: 10px; border-left: 4px solid #ff3860; background-color: #fff; }}
-                  .new-alert {{ border-left-color: #ff3860; }}
-                  .recurring-alert {{ border-left-color: #ffc107; }}
-                  .alert-type {{ display: inline-block; padding: 2px 8px; border-radius: 3px; font-size: 12px; font-weight: bold; margin-right: 10px; }}
-                  .type-new {{ background-color: #ff3860; color: white; }}
-                  .type-recurring {{ background-color: #ffc107; color: #333; }}
-                  .timestamp {{ color: #777; font-size: 14px; margin-top: 20px; }}
-                  .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #777; }}
-                  .summary {{ background-color: #f8f9fa; padding: 15px; border-radius: 4px; margin: 20px 0; }}
-                  .summary-item {{ display: inline-block; margin-right: 20px; }}
-                  .summary-count {{ font-size: 24px; font-weight: bold; }}
-                  .summary-label {{ font-size: 14px; color: #666; }}
-                </style>
-              </head>
-              <body>
-                <div class="container">
-                  <div class="logo">
-                    <img src="https://raw.githubusercontent.com/bnesim/heimdall-monitoring/refs/heads/main/HEIMDALL.png" alt="Heimdall Logo">
-                  </div>
-                  <h1>⚠️ Heimdall Alert Summary ⚠️</h1>
-                  
-                  <div class="summary">
-                    <div class="summary-item">
-                      <div class="summary-count" style="color: #ff3860;">{new_count}</div>
-                      <div class="summary-label">New Alerts</div>
-                    </div>
-                    <div class="summary-item">
-                      <div class="summary-count" style="color: #ffc107;">{recurring_count}</div>
-                      <div class="summary-label">Recurring Alerts</div>
-                    </div>
-                    <div class="summary-item">
-                      <div class="summary-count" style="color: #666;">{len(alerts_by_server)}</div>
-                      <div class="summary-label">Affected Servers</div>
-                    </div>
-                  </div>
-            """
-            
-            # Add alerts by server
-            for server_key, alerts in sorted(alerts_by_server.items()):
-                if not alerts["new"] and not alerts["recurring"]:
-                    continue
-                
-                html += f"""
-                  <div class="server-section">
-                    <div class="server-name">{server_key}</div>
-                """
+            parts = []
+            for server_key, alerts in alerts_by_server.items():
+                parts.append(BATCH_SERVER_SECTION_HEADER.format(server=html_escape(server_key)))
                 
                 # Add new alerts
                 for alert in alerts["new"]:
-                    html += f"""
-                    <div class="alert-item new-alert">
-                      <span class="alert-type type-new">NEW</span>
-                      {alert['message'].replace(chr(10), '<br>')}
-                    </div>
-                    """
+                    parts.append(BATCH_NEW_ALERT_ITEM.format(message_html=_html_text(alert.message)))
                 
                 # Add recurring alerts
                 for alert in alerts["recurring"]:
-                    html += f"""
-                    <div class="alert-item recurring-alert">
-                      <span class="alert-type type-recurring">RECURRING</span>
-                      {alert['message'].replace(chr(10), '<br>')}
-                    </div>
-                    """
+                    parts.append(BATCH_RECURRING_ALERT_ITEM.format(message_html=_html_text(alert.message)))
                 
-                html += "</div>"
+                parts.append("</div>")
             
-            html += f"""
-                  <div class="timestamp">
-                    Detected: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-                  </div>
-                  
-                  {open_alerts_html}
-                  
-                  <div class="footer">
-                    This is an automated batch alert from Heimdall monitoring system.
-                    <br>You will not receive another notification about these issues for at least {self.config.get('alert_cooldown', 1)} hour(s).
-                  </div>
-                </div>
-              </body>
-            </html>
-            """
+            # Recurring alerts back off, so quote the longest cooldown in the batch
+            active_alerts = self.alert_status["active_alerts"]
+            alert_cooldown = max((self._cooldown_hours(active_alerts[alert.alert_id])
+                                  for alerts in alerts_by_server.values()
+                                  for alert in alerts["new"] + alerts["recurring"]
+                                  if alert.alert_id in active_alerts),
+                                 default=self._alert_cooldown_hours)
+            
+            html = BATCH_ALERTS_EMAIL_TEMPLATE.format_map({
+                "logo_src": self._logo_src,
+                "new_count": new_count,
+                "recurring_count": recurring_count,
+                "server_count": len(alerts_by_server),
+                "servers_html": "".join(parts),
+                "detected": now_str,
+                "open_alerts_html": open_alerts_html,
+                "alert_cooldown": alert_cooldown
+            })
             
-            msg.attach(MIMEText(html, 'html'))
+            self._attach_html(msg, html)
             
-            # Send the email
-            with smtplib.SMTP(self.config['email']['smtp_server'], 
-                            self.config['email']['smtp_port']) as server:
-                if self.config['email']['use_tls']:
-                    server.starttls()
-                server.login(self.config['email']['username'],
-                           self.config['email']['password'])
-                server.send_message(msg)
+            # Send the email, unless the rate limit deferred it
+            if not self._smtp_send(msg):
+                return False
             
             logger.info(f"Batch alert email sent with {new_count} new and {recurring_count} recurring alerts")
             return True
@@ -836,15 +1390,10 @@ If you're receiving this, your Telegram configuration is working correctly!"""
             logger.error(f"Failed to send batch alert email: {str(e)}")
             return False
     
-    def _send_batch_resolution_email(self, resolutions_by_server):
+    def _send_batch_resolution_email(self, resolutions_by_server, total_resolved, now_str):
         """Send a single email with all resolved alerts."""
         try:
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.config['email']['sender']
-            msg['To'] = ", ".join(self.config['email']['recipients'])
-            
-            # Count resolutions
-            total_resolved = sum(len(resolutions) for resolutions in resolutions_by_server.values())
+            msg = self._new_email_message()
             
             msg['Subject'] = f"HEIMDALL RESOLVED: {total_resolved} issues resolved"
             
@@ -852,85 +1401,34 @@ If you're receiving this, your Telegram configuration is working correctly!"""
             open_alerts_html = self.format_open_alerts_html()
             
             # Build HTML content
-            html = f"""
-            <html>
-              <head>
-                <style>
-                  body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; background-color: #f9f9f9; margin: 0; padding: 0; }}
-                  .container {{ max-width: 800px; margin: 20px auto; padding: 20px; background-color: #fff; border-radius: 5px; border-top: 5px solid #48c774; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1); }}
-                  h1 {{ color: #48c774; margin-top: 0; }}
-                  .logo {{ text-align: center; margin-bottom: 20px; }}
-                  .logo img {{ width: 150px; height: auto; }}
-                  .server-section {{ background-color: #f5f5f5; padding: 15px; border-radius: 4px; margin: 20px 0; }}
-                  .server-name {{ font-size: 18px; font-weight: bold; color: #333; }}
-                  .resolution-item {{ margin: 10px 0; padding: 10px; border-left: 4px solid #48c774; background-color: #fff; }}
-                  .metric-info {{ margin-top: 5px; font-size: 14px; color: #666; }}
-                  .duration {{ color: #777; font-style: italic; }}
-                  .timestamp {{ color: #777; font-size: 14px; margin-top: 20px; }}
-                  .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #777; }}
-                  .summary {{ background-color: #f8f9fa; padding: 15px; border-radius: 4px; margin: 20px 0; }}
-                  .summary-count {{ font-size: 24px; font-weight: bold; color: #48c774; }}
-                  .summary-label {{ font-size: 14px; color: #666; }}
-                </style>
-              </head>
-              <body>
-                <div class="container">
-                  <div class="logo">
-                    <img src="https://raw.githubusercontent.com/bnesim/heimdall-monitoring/refs/heads/main/HEIMDALL.png" alt="Heimdall Logo">
-                  </div>
-                  <h1>✅ Alerts Resolved</h1>
-                  
-                  <div class="summary">
-                    <div class="summary-count">{total_resolved}</div>
-                    <div class="summary-label">Issues Resolved on {len(resolutions_by_server)} server(s)</div>
-                  </div>
-            """
-            
-            # Add resolutions by server
-            for server_key, resolutions in sorted(resolutions_by_server.items()):
-                html += f"""
-                  <div class="server-section">
-                    <div class="server-name">{server_key}</div>
-                """
+            parts = []
+            for server_key, resolutions in resolutions_by_server.items():
+                parts.append(BATCH_SERVER_SECTION_HEADER.format(server=html_escape(server_key)))
                 
                 for resolution in resolutions:
-                    html += f"""
-                    <div class="resolution-item">
-                      <strong>{resolution['metric']}</strong> has returned to normal
-                      <div class="metric-info">
-                        Current: {resolution['current_value']:.1f}% (threshold: {resolution['threshold']}%)
-                        <br><span class="duration">Problem duration: {resolution['duration']}</span>
-                      </div>
-                    </div>
-                    """
+                    parts.append(BATCH_RESOLUTION_ITEM.format(
+                        metric=html_escape(resolution['metric']),
+                        current_value=resolution['current_value'],
+                        threshold=resolution['threshold'],
+                        duration=resolution['duration']
+                    ))
                 
-                html += "</div>"
+                parts.append("</div>")
             
-            html += f"""
-                  <div class="timestamp">
-                    Resolved: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-                  </div>
-                  
-                  {open_alerts_html}
-                  
-                  <div class="footer">
-                    This is an automated resolution notification from Heimdall monitoring system.
-                  </div>
-                </div>
-              </body>
-            </html>
-            """
+            html = BATCH_RESOLUTIONS_EMAIL_TEMPLATE.format_map({
+                "logo_src": self._logo_src,
+                "total_resolved": total_resolved,
+                "server_count": len(resolutions_by_server),
+                "servers_html": "".join(parts),
+                "resolved": now_str,
+                "open_alerts_html": open_alerts_html
+            })
             
-            msg.attach(MIMEText(html, 'html'))
+            self._attach_html(msg, html)
             
-            # Send the email
-            with smtplib.SMTP(self.config['email']['smtp_server'], 
-                            self.config['email']['smtp_port']) as server:
-                if self.config['email']['use_tls']:
-                    server.starttls()
-                server.login(self.config['email']['username'],
-                           self.config['email']['password'])
-                server.send_message(msg)
+            # Send the email, unless the rate limit deferred it
+            if not self._smtp_send(msg):
+                return False
             
             logger.info(f"Batch resolution email sent with {total_resolved} resolved alerts")
             return True
@@ -938,56 +1436,43 @@ If you're receiving this, your Telegram configuration is working correctly!"""
             logger.error(f"Failed to send batch resolution email: {str(e)}")
             return False
     
-    def _send_batch_telegram_alerts(self, alerts_by_server):
+    def _send_batch_telegram_alerts(self, alerts_by_server, new_count, recurring_count):
         """Send batch Telegram message with all alerts."""
         try:
-            # Count alerts
-            new_count = sum(len(alerts["new"]) for alerts in alerts_by_server.values())
-            recurring_count = sum(len(alerts["recurring"]) for alerts in alerts_by_server.values())
+            # Send to approved subscribers only, skip building the message if there are none
+            approved_subscribers = self.telegram_bot.get_approved_subscribers()
+            if not approved_subscribers:
+                return False
             
             # Build message
-            if new_count > 0 and recurring_count > 0:
-                message = f"<b>⚠️ HEIMDALL ALERT SUMMARY</b>\n\n"
-                message += f"<b>{new_count}</b> new issues, <b>{recurring_count}</b> recurring issues\n"
-            elif new_count > 0:
-                message = f"<b>⚠️ NEW HEIMDALL ALERTS</b>\n\n"
-                message += f"<b>{new_count}</b> new issues detected\n"
-            else:
-                message = f"<b>⚠️ RECURRING HEIMDALL ALERTS</b>\n\n"
-                message += f"<b>{recurring_count}</b> issues persist\n"
-            
-            message += f"<b>{len(alerts_by_server)}</b> servers affected\n\n"
+            parts = [_batch_alert_telegram_header(new_count, recurring_count),
+                     f"<b>{len(alerts_by_server)}</b> servers affected\n\n"]
             
             # Add alerts by server
-            for server_key, alerts in sorted(alerts_by_server.items()):
-                if not alerts["new"] and not alerts["recurring"]:
-                    continue
-                
-                message += f"<b>{server_key}</b>\n"
+            for server_key, alerts in alerts_by_server.items():
+                parts.append(f"<b>{server_key}</b>\n")
                 
                 # Add new alerts
                 for alert in alerts["new"]:
-                    message += f"  🔴 <b>NEW:</b> {alert['message']}\n"
+                    parts.append(f"  🔴 <b>NEW:</b> {alert.message}\n")
                 
                 # Add recurring alerts
                 for alert in alerts["recurring"]:
-                    message += f"  🟡 <b>RECURRING:</b> {alert['message']}\n"
+                    parts.append(f"  🟡 <b>RECURRING:</b> {alert.message}\n")
                 
-                message += "\n"
+                parts.append("\n")
             
             # Add open alerts
-            message += self.format_open_alerts_text()
+            parts.append(self.format_open_alerts_text())
+            message = "".join(parts)
 
-            # Send to approved subscribers only
-            approved_subscribers = self.telegram_bot.get_approved_subscribers()
             logger.info(f"Sending batch alert to {len(approved_subscribers)} approved Telegram subscribers")
 
             sent_count = 0
-            for subscriber in approved_subscribers:
+            for subscriber, sent in self.telegram_bot.send_to_subscribers(approved_subscribers, message):
                 chat_id = subscriber['chat_id']
                 username = subscriber.get('username') or subscriber.get('first_name') or 'Unknown'
-                logger.info(f"Sending batch alert to {username} (chat_id: {chat_id})")
-                if self.telegram_bot.send_message(chat_id, message):
+                if sent:
                     sent_count += 1
                     logger.info(f"Successfully sent batch alert to {username} (chat_id: {chat_id})")
                 else:
@@ -999,38 +1484,38 @@ If you're receiving this, your Telegram configuration is working correctly!"""
             logger.error(f"Failed to send batch Telegram alerts: {str(e)}")
             return False
     
-    def _send_batch_telegram_resolutions(self, resolutions_by_server):
+    def _send_batch_telegram_resolutions(self, resolutions_by_server, total_resolved):
         """Send batch Telegram message with all resolutions."""
         try:
-            # Count resolutions
-            total_resolved = sum(len(resolutions) for resolutions in resolutions_by_server.values())
+            # Send to approved subscribers only, skip building the message if there are none
+            approved_subscribers = self.telegram_bot.get_approved_subscribers()
+            if not approved_subscribers:
+                return False
             
-            message = f"<b>✅ HEIMDALL RESOLVED</b>\n\n"
-            message += f"<b>{total_resolved}</b> issues resolved on <b>{len(resolutions_by_server)}</b> server(s)\n\n"
+            parts = ["<b>✅ HEIMDALL RESOLVED</b>\n\n",
+                     f"<b>{total_resolved}</b> issues resolved on <b>{len(resolutions_by_server)}</b> server(s)\n\n"]
             
             # Add resolutions by server
-            for server_key, resolutions in sorted(resolutions_by_server.items()):
-                message += f"<b>{server_key}</b>\n"
+            for server_key, resolutions in resolutions_by_server.items():
+                parts.append(f"<b>{server_key}</b>\n")
                 
                 for resolution in resolutions:
-                    message += f"  ✅ <b>{resolution['metric']}</b>: {resolution['current_value']:.1f}% (threshold: {resolution['threshold']}%)\n"
-                    message += f"     Duration: {resolution['duration']}\n"
+                    parts.append(f"  ✅ <b>{resolution['metric']}</b>: {resolution['current_value']:.1f}% (threshold: {resolution['threshold']}%)\n")
+                    parts.append(f"     Duration: {resolution['duration']}\n")
                 
-                message += "\n"
+                parts.append("\n")
             
             # Add open alerts
-            message += self.format_open_alerts_text()
+            parts.append(self.format_open_alerts_text())
+            message = "".join(parts)
 
-            # Send to approved subscribers only
-            approved_subscribers = self.telegram_bot.get_approved_subscribers()
             logger.info(f"Sending batch resolution to {len(approved_subscribers)} approved Telegram subscribers")
 
             sent_count = 0
-            for subscriber in approved_subscribers:
+            for subscriber, sent in self.telegram_bot.send_to_subscribers(approved_subscribers, message):
                 chat_id = subscriber['chat_id']
                 username = subscriber.get('username') or subscriber.get('first_name') or 'Unknown'
-                logger.info(f"Sending batch resolution to {username} (chat_id: {chat_id})")
-                if self.telegram_bot.send_message(chat_id, message):
+                if sent:
                     sent_count += 1
                     logger.info(f"Successfully sent batch resolution to {username} (chat_id: {chat_id})")
                 else:
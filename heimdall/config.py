@@ -8,8 +8,8 @@ and server configurations.
 """
 
 import json
-import os
 import logging
+from .utils import json_loads, write_json_file
 
 # Configuration files
 SERVERS_FILE = "servers.json"
@@ -20,10 +20,10 @@ logger = logging.getLogger("Heimdall")
 def load_config():
     """Load the main configuration file."""
     try:
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'r') as f:
-                return json.load(f)
-        else:
+        try:
+            with open(CONFIG_FILE, 'rb') as f:
+                return json_loads(f.read())
+        except FileNotFoundError:
             # Create default config
             default_config = {
                 "email": {
@@ -52,10 +52,10 @@ def load_config():
                     "disk": 85
                 },
                 "check_interval": 300,
-                "alert_cooldown": 1
+                "alert_cooldown": 1,
+                "alert_cooldown_max": 8
             }
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(default_config, f, indent=2)
+            write_json_file(CONFIG_FILE, default_config)
             return default_config
     except Exception as e:
         logger.error(f"Error loading configuration: {str(e)}")
@@ -68,25 +68,23 @@ class ServerConfig:
     
     def load_servers(self):
         """Load servers from the JSON file."""
-        if os.path.exists(SERVERS_FILE):
-            try:
-                with open(SERVERS_FILE, 'r') as f:
-                    data = json.load(f)
-                    self.servers = data.get('servers', [])
-                logger.info(f"Loaded {len(self.servers)} servers from configuration")
-            except json.JSONDecodeError:
-                logger.error(f"Invalid JSON in {SERVERS_FILE}")
-                self.servers = []
-        else:
+        try:
+            with open(SERVERS_FILE, 'rb') as f:
+                data = json_loads(f.read())
+                self.servers = data.get('servers', [])
+            logger.info(f"Loaded {len(self.servers)} servers from configuration")
+        except FileNotFoundError:
             # Create an empty servers file
             logger.info(f"Creating new servers file: {SERVERS_FILE}")
             self.save_servers()
+        except json.JSONDecodeError:
+            logger.error(f"Invalid JSON in {SERVERS_FILE}")
+            self.servers = []
     
     def save_servers(self):
         """Save servers to the JSON file."""
         data = {'servers': self.servers}
-        with open(SERVERS_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
+        write_json_file(SERVERS_FILE, data)
         logger.info(f"Saved {len(self.servers)} servers to configuration")
     
     def add_server(self, server_data):
@@ -7,22 +7,203 @@ This module handles the core server monitoring functionality,
 including SSH connections, resource checks, and service monitoring.
 """
 
+import io
 import os
+import re
+import shlex
+import atexit
 import socket
-import paramiko
+import subprocess
 import logging
+import threading
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
 from .utils import Colors
 from .alerts import AlertManager
 from .ai_assistant import AIAssistant
 
 logger = logging.getLogger("Heimdall")
 
+# Maximum number of servers checked concurrently
+MAX_PARALLEL_CHECKS = 32
+
+# Seconds between keepalive packets on cached SSH connections
+SSH_KEEPALIVE_INTERVAL = 30
+
+# Seconds a remote command may run before it is abandoned
+SSH_COMMAND_TIMEOUT = 10
+
+# OpenSSH connection multiplexing, used instead of paramiko when the
+# use_openssh_mux config option is set
+SSH_CONTROL_PATH = "/tmp/heimdall-%r@%h:%p"
+SSH_CONTROL_PERSIST = 600
+SSH_MUX_COMMAND_TIMEOUT = 30
+
+# Single remote command collecting CPU, memory and disk usage, one
+# ##SECTION## marker line before each part of the output
+RESOURCE_CHECK_CMD = (
+    "echo '##CPU##'; head -n1 /proc/stat; "
+    "echo '##MEM##'; free; "
+    "echo '##DISK##'; df --output=source,target,pcent -x tmpfs -x devtmpfs -x squashfs"
+)
+
+# Parsers for the MEM section ("Mem: total used ...") and the DISK section
+# ("source target pcent" lines; mount points may contain spaces, and the
+# df header line does not match)
+_MEM_RE = re.compile(r'^Mem:\s+(\d+)\s+(\d+)', re.M)
+_DF_RE = re.compile(r'^(\S+)\s+(.+?)\s+(\d+)%\s*$', re.M)
+
+# Shell loop printing "<service>\t<status>" for each of {services}.
+# One systemctl call reports every service, then the service command and
+# pgrep are tried for the inactive ones. pgrep ignores every process in
+# this script's process group, since the shell and the subshells it forks
+# have command lines naming every service.
+SERVICE_CHECK_LOOP = (
+    "pg=$(ps -o pgid= -p $$); "
+    "set -- $(LANG=C LC_ALL=C systemctl is-active {services} 2>/dev/null); "
+    "for s in {services}; do "
+    "st=${{1:-inactive}}; [ $# -gt 0 ] && shift; "
+    "if [ \"$st\" = 'inactive' ]; then "
+    "st=$(LANG=C LC_ALL=C service \"$s\" status 2>/dev/null | grep -q 'running' && echo 'active' || echo 'inactive'); "
+    "if [ \"$st\" = 'inactive' ]; then "
+    "for p in $(LANG=C pgrep -f -- \"$s\"); do "
+    "g=$(ps -o pgid= -p \"$p\") && [ $g -ne $pg ] && {{ st='active'; break; }}; "
+    "done; fi; "
+    "fi; "
+    "printf '%s\\t%s\\n' \"$s\" \"$st\"; "
+    "done"
+)
+
+# Prints which tool lists services on the host: systemd, sysv or ps
+INIT_SYSTEM_PROBE = ("if [ -d /run/systemd/system ]; then echo systemd; "
+                     "elif command -v service >/dev/null 2>&1; then echo sysv; "
+                     "else echo ps; fi")
+
+# Processes sorted by CPU usage, formatted by _format_top_processes
+TOP_PROCESSES_CMD = "LANG=C LC_ALL=C ps -eo pid=,pcpu=,pmem=,rss=,comm= --sort=-pcpu"
+
+# Second /proc/stat sample appended to the resource check when there is no
+# previous sample for a host yet, so CPU usage needs no extra round trip
+CPU_RESAMPLE_CMD = "echo '##CPU2##'; sleep 0.2; head -n1 /proc/stat"
+
+# Two /proc/stat samples taken 0.2s apart, used when the samples above
+# cannot be compared
+CPU_SAMPLE_CMD = "head -n1 /proc/stat; sleep 0.2; head -n1 /proc/stat"
+
+# Per-thread console buffer used while servers are checked in parallel
+_output = threading.local()
+
+def _parse_sections(output):
+    """Split RESOURCE_CHECK_CMD output into a dict of section name to text."""
+    sections = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith('##') and line.endswith('##'):
+            current = line.strip('#')
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    return {name: '\n'.join(lines).strip() for name, lines in sections.items()}
+
+def _resource_check_cmd(services):
+    """Return RESOURCE_CHECK_CMD, extended with a ##SVC## section for the given services."""
+    if not services:
+        return RESOURCE_CHECK_CMD
+    quoted = ' '.join(shlex.quote(service) for service in services)
+    return f"{RESOURCE_CHECK_CMD}; echo '##SVC##'; {SERVICE_CHECK_LOOP.format(services=quoted)}"
+
+def _parse_service_status(output):
+    """Return {service: is_running} from the ##SVC## section output."""
+    status = {}
+    for line in output.splitlines():
+        service, _, state = line.rpartition('\t')
+        if service:
+            status[service] = state == 'active'
+    return status
+
+def _parse_cpu_sample(line):
+    """Return (idle, total) jiffies from the aggregate 'cpu' line of /proc/stat."""
+    fields = [int(value) for value in line.split()[1:9]]
+    # idle + iowait count as idle time
+    return fields[3] + fields[4], sum(fields)
+
+def _cpu_percent(previous, current):
+    """Return the busy CPU percentage between two (idle, total) samples, or None."""
+    total = current[1] - previous[1]
+    if total <= 0:
+        return None
+    return 100.0 * (total - (current[0] - previous[0])) / total
+
+def _format_top_processes(output, count):
+    """Format the first count lines of TOP_PROCESSES_CMD output as a table."""
+    lines = [f"Top {count} processes by CPU usage:",
+             "------------------------------------------",
+             f"{'PID':<10} {'CPU%':<10} {'MEM%':<10} {'COMMAND':<20} MEMORY(MB)"]
+    for line in output.splitlines()[:count]:
+        fields = line.split(None, 4)
+        if len(fields) < 5 or not fields[3].isdigit():
+            continue
+        pid, cpu, mem, rss, command = fields
+        lines.append(f"{pid:<10} {cpu:<10} {mem:<10} {command:<20} {int(rss) / 1024:.1f} MB")
+    return '\n'.join(lines) if len(lines) > 3 else ""
+
+def _print(*args, **kwargs):
+    """Print to the console, or to the current thread's buffer during a parallel check."""
+    buffer = getattr(_output, 'buffer', None)
+    if buffer is None:
+        print(*args, **kwargs)
+    else:
+        print(*args, file=buffer, **kwargs)
+
+class _OpenSSHClient:
+    """Minimal exec_command() stand-in for paramiko that runs commands with the
+    system ssh client over a shared ControlMaster connection."""
+    
+    def __init__(self, server):
+        self.args = ["ssh",
+                     "-o", "ControlMaster=auto",
+                     "-o", f"ControlPath={SSH_CONTROL_PATH}",
+                     "-o", f"ControlPersist={SSH_CONTROL_PERSIST}",
+                     "-o", "BatchMode=yes",
+                     "-o", "ConnectTimeout=5",
+                     "-o", "StrictHostKeyChecking=accept-new",
+                     "-p", str(server['port'])]
+        if server.get('key_path'):
+            self.args += ["-i", server['key_path']]
+        self.args.append(f"{server['username']}@{server['hostname']}")
+    
+    def exec_command(self, command, timeout=None, get_pty=False):
+        """Run a command on the server, returning (stdin, stdout, stderr) like paramiko."""
+        result = subprocess.run(self.args + [command], capture_output=True,
+                                timeout=timeout or SSH_MUX_COMMAND_TIMEOUT)
+        # ssh exits with 255 when the connection itself failed
+        if result.returncode == 255:
+            raise ConnectionError(result.stderr.decode('utf-8', errors='replace').strip() or "ssh connection failed")
+        return None, io.BytesIO(result.stdout), io.BytesIO(result.stderr)
+
 class ServerMonitor:
     def __init__(self, config, server_config):
         self.config = config
         self.server_config = server_config
         self.alert_manager = AlertManager(config)
         self.ai_assistant = AIAssistant(config)
+        self._ai_configured = self.ai_assistant.is_configured()
+        # du output per (hostname, mount, day), reused by repeated disk alerts
+        self._du_cache = {}
+        
+        # Last /proc/stat CPU sample per hostname
+        self._cpu_samples = {}
+        
+        # Init system (systemd, sysv or ps) per hostname, probed once
+        self._init_systems = {}
+        
+        # Run checks through the system ssh client with connection multiplexing
+        self._use_openssh_mux = bool(config and config.get('use_openssh_mux', False))
+        
+        # Connected SSH clients reused across checks, keyed by (hostname, port, username)
+        self._ssh = {}
+        self._ssh_lock = threading.Lock()
+        atexit.register(self.close)
         
         # Set thresholds
         self.cpu_threshold = config['thresholds']['cpu'] if config else 80
@@ -31,60 +212,79 @@ class ServerMonitor:
     
     def test_ssh_connection(self, hostname, port, username, password=None, key_path=None):
         """Test SSH connection to a server using password or SSH key."""
+        server = {'hostname': hostname, 'port': port, 'username': username,
+                  'password': password, 'key_path': key_path}
         try:
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # Connection parameters
-            connect_params = {
-                'hostname': hostname,
-                'port': port,
-                'username': username,
-                'timeout': 5
-            }
-            
-            # Try SSH key authentication if key_path is provided
-            if key_path:
-                if os.path.exists(key_path):
-                    connect_params['key_filename'] = key_path
-                else:
-                    logger.warning(f"SSH key file not found: {key_path}")
-                    # Fall back to password if provided
-                    if password:
-                        connect_params['password'] = password
-            # Otherwise use password authentication
-            elif password:
-                connect_params['password'] = password
-            
-            client.connect(**connect_params)
-            client.close()
+            # Always open a fresh connection so the given credentials are tested;
+            # it is kept for the calls that follow when adding a server
+            self._drop_client(server)
+            self._get_client(server)
             return True
         except Exception as e:
             logger.error(f"SSH connection error to {hostname}: {str(e)}")
             print(Colors.red(f"SSH connection error: {str(e)}"))
             return False
     
-    def get_running_services(self, client):
+    def _exec(self, client, command, timeout=SSH_COMMAND_TIMEOUT):
+        """Run a remote command and return its decoded, stripped output ("" on timeout)."""
+        try:
+            stdin, stdout, stderr = client.exec_command(command, timeout=timeout, get_pty=False)
+            return stdout.read().decode('utf-8', errors='replace').strip()
+        except (socket.timeout, subprocess.TimeoutExpired):
+            logger.warning(f"Remote command timed out after {timeout}s: {command.strip().splitlines()[0]}")
+            return ""
+    
+    def _get_init_system(self, client, hostname=None):
+        """Return the cached init system of a host, probing it on first use."""
+        init_system = self._init_systems.get(hostname)
+        if init_system is None:
+            init_system = self._exec(client, INIT_SYSTEM_PROBE)
+            if init_system not in ('systemd', 'sysv', 'ps'):
+                # Probe failed or timed out, try systemd and probe again next time
+                return 'systemd'
+            if hostname:
+                self._init_systems[hostname] = init_system
+        return init_system
+    
+    def get_running_services(self, client, hostname=None):
         """Get a list of running services on the server."""
         try:
-            # Use systemctl to list running services on systemd-based systems
-            # Set LANG=C to avoid Unicode characters in output
-            stdin, stdout, stderr = client.exec_command("LANG=C LC_ALL=C systemctl list-units --type=service --state=running --no-pager --no-legend | grep \".service\" | awk '{print $1}'")
-            systemd_services = stdout.read().decode('utf-8', errors='replace').strip().split('\n')
-            
-            # If no systemd services found, try using service command for older systems
-            if not systemd_services or systemd_services == ['']:
-                stdin, stdout, stderr = client.exec_command("LANG=C LC_ALL=C service --status-all 2>&1 | grep '\[ + \]' | awk '{print $4}'")
-                sysv_services = stdout.read().decode('utf-8', errors='replace').strip().split('\n')
-                if sysv_services and sysv_services != ['']:
+            init_system = self._get_init_system(client, hostname)
+            
+            if init_system == 'systemd':
+                # Set LANG=C to avoid Unicode characters in output
+                units = self._exec(client, "LANG=C LC_ALL=C systemctl list-units --type=service --state=running --no-pager --no-legend")
+                systemd_services = []
+                for line in units.splitlines():
+                    unit = line.split()[0] if line.strip() else ''
+                    if unit.endswith('.service'):
+                        systemd_services.append(unit[:-len('.service')])
+                if systemd_services:
+                    return systemd_services
+            elif init_system == 'sysv':
+                # Use the service command on older systems
+                status = self._exec(client, "LANG=C LC_ALL=C service --status-all 2>&1")
+                # Running services are listed as " [ + ]  name"
+                sysv_services = [line.split(']', 1)[1].strip() for line in status.splitlines()
+                                 if '[ + ]' in line]
+                sysv_services = [s for s in sysv_services if s]
+                if sysv_services:
                     return sysv_services
-            else:
-                return [s.replace('.service', '') for s in systemd_services if s]
                 
             # As a last resort, try using ps to find processes that might be services
-            stdin, stdout, stderr = client.exec_command("LANG=C LC_ALL=C ps -eo comm= | sort | uniq")
-            processes = stdout.read().decode('utf-8', errors='replace').strip().split('\n')
-            return [p for p in processes if p and not p.startswith('[')][:20]  # Limit to first 20 to avoid overwhelming
+            # Read line by line and stop at the first 20 to avoid overwhelming
+            stdin, stdout, stderr = client.exec_command("LANG=C LC_ALL=C ps -eo comm= | sort | uniq",
+                                                        timeout=SSH_COMMAND_TIMEOUT)
+            processes = []
+            for line in stdout:
+                # paramiko yields text lines from a non-binary channel file
+                process = line.decode('utf-8', errors='replace').strip() if isinstance(line, bytes) else line.strip()
+                if process and not process.startswith('['):
+                    processes.append(process)
+                    if len(processes) >= 20:
+                        stdout.channel.close()
+                        break
+            return processes
             
         except Exception as e:
             logger.error(f"Error getting running services: {str(e)}")
@@ -92,36 +292,17 @@ class ServerMonitor:
     
     def select_services_to_monitor(self, hostname, port, username, password=None, key_path=None):
         """Connect to server and let user select which services to monitor."""
+        server = {'hostname': hostname, 'port': port, 'username': username,
+                  'password': password, 'key_path': key_path}
         try:
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # Connection parameters
-            connect_params = {
-                'hostname': hostname,
-                'port': port,
-                'username': username,
-                'timeout': 5
-            }
-            
-            # Try SSH key authentication if key_path is provided
-            if key_path:
-                if os.path.exists(key_path):
-                    connect_params['key_filename'] = key_path
-                else:
-                    logger.warning(f"SSH key file not found: {key_path}")
-                    # Fall back to password if provided
-                    if password:
-                        connect_params['password'] = password
-            # Otherwise use password authentication
-            elif password:
-                connect_params['password'] = password
-            
-            client.connect(**connect_params)
+            client = self.get_connection(server)
             
             # Get running services
-            services = self.get_running_services(client)
-            client.close()
+            services = self.get_running_services(client, hostname)
+            
+            # Nothing below needs the server, so close the connection rather
+            # than keep an idle session open while waiting for the user
+            self._drop_client(server)
             
             if not services:
                 print(Colors.yellow("No services found on the server."))
@@ -153,215 +334,315 @@ class ServerMonitor:
             print(Colors.red(f"Error connecting to server: {str(e)}"))
             return []
     
-    def check_service_status(self, client, service):
-        """Check if a service is running on the server."""
+    def _build_connect_params(self, server):
+        """Return paramiko connect() arguments for a server, preferring key authentication."""
+        password = server.get('password')
+        key_path = server.get('key_path')
+        
+        # Connection parameters
+        connect_params = {
+            'hostname': server['hostname'],
+            'port': server['port'],
+            'username': server['username'],
+            'timeout': 5
+        }
+        
+        # Try SSH key authentication if key_path is provided
+        if key_path:
+            if os.path.exists(key_path):
+                connect_params['key_filename'] = key_path
+            else:
+                logger.warning(f"SSH key file not found: {key_path}, falling back to password")
+                if password:
+                    connect_params['password'] = password
+        # Otherwise use password authentication
+        elif password:
+            connect_params['password'] = password
+        return connect_params
+    
+    def _connect(self, server):
+        """Open a new SSH connection to a server."""
+        import paramiko
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        
         try:
-            # Try systemctl first (for systemd systems)
-            stdin, stdout, stderr = client.exec_command(f"LANG=C LC_ALL=C systemctl is-active {service} 2>/dev/null || echo 'inactive'")
-            status = stdout.read().decode('utf-8', errors='replace').strip()
-            
-            if status == 'inactive':
-                # Try service command for older systems
-                stdin, stdout, stderr = client.exec_command(f"LANG=C LC_ALL=C service {service} status 2>/dev/null | grep -q 'running' && echo 'active' || echo 'inactive'")
-                status = stdout.read().decode('utf-8', errors='replace').strip()
-                
-                if status == 'inactive':
-                    # Last resort: check if process is running
-                    stdin, stdout, stderr = client.exec_command(f"LANG=C LC_ALL=C ps -ef | grep -v grep | grep -q '{service}' && echo 'active' || echo 'inactive'")
-                    status = stdout.read().decode('utf-8', errors='replace').strip()
-            
-            return status == 'active'
-            
+            client.connect(**self._build_connect_params(server))
+        except paramiko.AuthenticationException:
+            raise
+        except paramiko.SSHException as e:
+            # Banner or key exchange timeouts on a half-up host: report the
+            # server as unreachable rather than as an SSH error
+            raise ConnectionError(str(e)) from e
+        client.get_transport().set_keepalive(SSH_KEEPALIVE_INTERVAL)
+        return client
+    
+    def _get_client(self, server):
+        """Return (client, reused) with a connected SSH client, reusing a cached one if still active."""
+        key = (server['hostname'], server['port'], server['username'])
+        with self._ssh_lock:
+            client = self._ssh.get(key)
+        if client is not None:
+            transport = client.get_transport()
+            if transport is not None and transport.is_active():
+                try:
+                    # Cheap write that fails fast if the connection has died
+                    transport.send_ignore()
+                    return client, True
+                except Exception as e:
+                    logger.info(f"Cached SSH connection to {server['hostname']} is dead: {str(e)}")
+            self._drop_client(server)
+        
+        client = self._connect(server)
+        with self._ssh_lock:
+            self._ssh[key] = client
+        return client, False
+    
+    def get_connection(self, server):
+        """Return a connected SSH client for a server, reusing a cached one when possible."""
+        client, reused = self._get_client(server)
+        return client
+    
+    def _drop_client(self, server):
+        """Close and forget the cached SSH client for a server."""
+        key = (server['hostname'], server['port'], server['username'])
+        with self._ssh_lock:
+            client = self._ssh.pop(key, None)
+        if client is not None:
+            try:
+                client.close()
+            except Exception:
+                pass
+    
+    def close(self):
+        """Close all cached SSH connections. Registered to run at exit."""
+        with self._ssh_lock:
+            clients = list(self._ssh.values())
+            self._ssh.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+    
+    def _get_cpu_usage(self, client, hostname, sections):
+        """Compute CPU usage from /proc/stat against the host's previous sample."""
+        try:
+            current = _parse_cpu_sample(sections.get('CPU', ''))
+            previous = self._cpu_samples.get(hostname)
+            if sections.get('CPU2'):
+                previous, current = current, _parse_cpu_sample(sections['CPU2'])
+            self._cpu_samples[hostname] = current
+            usage = _cpu_percent(previous, current) if previous else None
+            if usage is None:
+                # Samples not comparable, take two more a moment apart
+                lines = self._exec(client, CPU_SAMPLE_CMD).split('\n')
+                previous, current = _parse_cpu_sample(lines[0]), _parse_cpu_sample(lines[-1])
+                self._cpu_samples[hostname] = current
+                usage = _cpu_percent(previous, current)
+            return usage
+        except (ValueError, IndexError) as e:
+            logger.error(f"Error parsing CPU data for {hostname}: {str(e)}")
+            return None
+    
+    def _get_du_output(self, client, hostname, mount):
+        """Return du output for the largest directories of a mount, scanned at most once a day."""
+        cache_key = (hostname, mount, date.today())
+        du_output = self._du_cache.get(cache_key)
+        if du_output is not None:
+            _print(f"    Reusing today's disk analysis...")
+            return du_output
+        
+        # Get du -sh output for top directories
+        # For root filesystem, use a more targeted approach to avoid long scans
+        if mount == '/':
+            # Check specific directories that commonly grow large
+            du_command = "du -sh /var /tmp /home /opt /usr /root 2>/dev/null | sort -rh"
+        else:
+            du_command = f"du -sh {mount}/* 2>/dev/null | sort -rh | head -20"
+        
+        _print(f"    Running disk analysis...")
+        try:
+            stdin, stdout, stderr = client.exec_command(du_command, timeout=30)
+            du_output = stdout.read().decode('utf-8', errors='replace').strip()
         except Exception as e:
-            logger.error(f"Error checking service status for {service}: {str(e)}")
-            return False
+            logger.warning(f"Disk analysis command timed out or failed: {str(e)}")
+            du_output = ""
+        
+        # If du command failed or timed out, try a simpler command
+        if not du_output or len(du_output) < 10:
+            _print(f"    Using quick analysis mode...")
+            # Just get the largest subdirectories without recursion
+            if mount == '/':
+                # Simpler command that's more likely to work
+                du_command = "cd / && du -sh * 2>/dev/null | sort -rh | head -10"
+            else:
+                du_command = f"cd {mount} && du -sh * 2>/dev/null | sort -rh | head -10"
+            try:
+                stdin, stdout, stderr = client.exec_command(du_command, timeout=10)
+                du_output = stdout.read().decode('utf-8', errors='replace').strip()
+            except Exception as e2:
+                logger.warning(f"Quick analysis also failed: {str(e2)}")
+                # Not cached, so the next alert tries again
+                return "Unable to analyze disk usage"
+        
+        # Drop entries from previous days before caching today's result
+        today = cache_key[2]
+        for key in [key for key in list(self._du_cache) if key[2] != today]:
+            self._du_cache.pop(key, None)
+        self._du_cache[cache_key] = du_output
+        return du_output
+    
+    def _run_resource_check(self, server):
+        """Connect to a server and run the combined resource command, returning (client, output)."""
+        # The system ssh client cannot take a password non-interactively
+        if self._use_openssh_mux and (server.get('key_path') or not server.get('password')):
+            client, reused = _OpenSSHClient(server), False
+        else:
+            client, reused = self._get_client(server)
+        
+        # Collect CPU, memory, disk and service status in one round trip
+        resource_cmd = _resource_check_cmd(server.get('monitored_services'))
+        if server['hostname'] not in self._cpu_samples:
+            resource_cmd += f"; {CPU_RESAMPLE_CMD}"
+        while True:
+            try:
+                stdin, stdout, stderr = client.exec_command(resource_cmd, timeout=SSH_COMMAND_TIMEOUT)
+                return client, stdout.read()
+            except (socket.timeout, subprocess.TimeoutExpired):
+                # Reported as unreachable, so the alert resolves on the next good check
+                raise TimeoutError(f"Resource check did not finish within {SSH_COMMAND_TIMEOUT}s")
+            except Exception as e:
+                if not reused:
+                    raise
+                # The cached connection went stale, reconnect and retry once
+                logger.info(f"{server['nickname']} ({server['hostname']}): Cached SSH connection failed ({str(e)}), reconnecting")
+                self._drop_client(server)
+                client, reused = self._get_client(server)
     
     def check_server(self, server):
         """Check a single server for CPU, memory, disk usage, and monitored services."""
         hostname = server['hostname']
-        port = server['port']
-        username = server['username']
-        password = server.get('password')
-        key_path = server.get('key_path')
         nickname = server['nickname']
         
-        print(f"\n{Colors.bold(Colors.yellow('Checking server:'))} {Colors.green(nickname)} ({hostname})")
+        _print(f"\n{Colors.bold(Colors.yellow('Checking server:'))} {Colors.green(nickname)} ({hostname})")
         logger.info(f"Checking server: {nickname} ({hostname})")
         
-        # Check if the server is reachable
-        try:
-            socket.create_connection((hostname, port), timeout=5)
-        except Exception as e:
-            error_msg = f"Server is not reachable: {str(e)}"
-            logger.error(f"{nickname} ({hostname}): {error_msg}")
-            print(Colors.red(f"ERROR: {error_msg}"))
-            self.alert_manager.send_alert(nickname, hostname, error_msg)
-            return False
-        
         # SSH connection and checks
         try:
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            print(f"SSH Connection: ", end='')
-            
-            # Connection parameters
-            connect_params = {
-                'hostname': hostname,
-                'port': port,
-                'username': username,
-                'timeout': 5
-            }
-            
-            # Try SSH key authentication if key_path is provided
-            if key_path:
-                if os.path.exists(key_path):
-                    connect_params['key_filename'] = key_path
-                else:
-                    logger.warning(f"SSH key file not found: {key_path}, falling back to password")
-                    if password:
-                        connect_params['password'] = password
-            # Otherwise use password authentication
-            elif password:
-                connect_params['password'] = password
-            
-            client.connect(**connect_params)
-            print(Colors.green("Success"))
-            
-            # Check if this resolves a server unreachable alert
+            _print(f"SSH Connection: ", end='')
+            try:
+                client, resource_output = self._run_resource_check(server)
+            except OSError as e:
+                # Timeouts, refused connections, name lookup failures and SSH
+                # handshake errors mean the server is unreachable; authentication
+                # errors are reported below
+                self._drop_client(server)
+                error_msg = f"Server is not reachable: {str(e)}"
+                logger.error(f"{nickname} ({hostname}): {error_msg}")
+                _print(Colors.red(f"ERROR: {error_msg}"))
+                self.alert_manager.send_alert(nickname, hostname, error_msg)
+                return False
+            sections = _parse_sections(resource_output.decode('utf-8', errors='replace'))
+            _print(Colors.green("Success"))
+            
+            # Check if this resolves a server unreachable or check error alert
             self.alert_manager.check_alert_resolution(nickname, hostname, "server", 0, 1)
+            self.alert_manager.check_alert_resolution(nickname, hostname, "error", 0, 1)
             
             # Check CPU usage
-            print(f"CPU Usage: ", end='')
-            stdin, stdout, stderr = client.exec_command("top -bn1 | grep 'Cpu(s)' | awk '{print $2 + $4}'")
-            cpu_output = stdout.read().decode('utf-8', errors='replace').strip()
+            _print(f"CPU Usage: ", end='')
+            cpu_usage = self._get_cpu_usage(client, hostname, sections)
             
-            if cpu_output:
-                cpu_usage = float(cpu_output)
+            if cpu_usage is not None:
                 if cpu_usage >= self.cpu_threshold:
                     logger.warning(f"{nickname} ({hostname}): High CPU usage: {cpu_usage:.1f}%")
-                    print(Colors.red(f"{cpu_usage:.1f}% (ALERT - above threshold)"))
+                    _print(Colors.red(f"{cpu_usage:.1f}% (ALERT - above threshold)"))
                     
                     # Get process diagnostics for high CPU
                     alert_msg = f"CPU usage at {cpu_usage:.1f}%, threshold is {self.cpu_threshold}%"
                     
                     try:
-                        print(f"  Getting process diagnostics...")
+                        _print(f"  Getting process diagnostics...")
                         # Get top processes by CPU usage
-                        num_processes = 10
-                        diagnostics_cmd = f'''
-                        NUM_PROCESSES={num_processes}
-                        echo "Top $NUM_PROCESSES processes by CPU usage:"
-                        echo "------------------------------------------"
-                        # Try Linux ps first, fall back to BSD ps if that fails
-                        ps aux --sort=-%cpu 2>/dev/null | awk -v num="$NUM_PROCESSES" 'NR<=num+1{{printf "%-10s %-10s %-10s %-20s %.1f MB\\n", $2, $3, $4, $11, $6/1024}}' | sed '1s/^/PID        CPU%      MEM%      COMMAND            MEMORY(MB)\\n/' || \\
-                        ps aux | sort -rn -k 3 | head -n $((NUM_PROCESSES+1)) | awk 'NR<=11{{printf "%-10s %-10s %-10s %-20s %.1f MB\\n", $2, $3, $4, $11, $6/1024}}' | sed '1s/^/PID        CPU%      MEM%      COMMAND            MEMORY(MB)\\n/'
-                        '''
-                        
-                        stdin, stdout, stderr = client.exec_command(diagnostics_cmd)
-                        process_output = stdout.read().decode('utf-8', errors='replace').strip()
+                        process_output = _format_top_processes(self._exec(client, TOP_PROCESSES_CMD), 10)
                         
                         if process_output:
                             alert_msg += "\n\nProcess Diagnostics:\n" + process_output
-                            print(f"  {Colors.green('Process diagnostics completed')}")
+                            _print(f"  {Colors.green('Process diagnostics completed')}")
                         else:
                             logger.warning(f"Failed to get process diagnostics")
-                            print(f"  {Colors.yellow('Process diagnostics not available')}")
+                            _print(f"  {Colors.yellow('Process diagnostics not available')}")
                             
                     except Exception as e:
                         logger.error(f"Error getting process diagnostics: {str(e)}")
-                        print(f"  {Colors.yellow('Process diagnostics failed: ' + str(e))}")
+                        _print(f"  {Colors.yellow('Process diagnostics failed: ' + str(e))}")
                     
                     self.alert_manager.send_alert(nickname, hostname, alert_msg)
                 else:
                     logger.info(f"{nickname} ({hostname}): CPU usage: {cpu_usage:.1f}%")
-                    print(Colors.green(f"{cpu_usage:.1f}%"))
+                    _print(Colors.green(f"{cpu_usage:.1f}%"))
                     self.alert_manager.check_alert_resolution(nickname, hostname, "CPU", 
                         cpu_usage, self.cpu_threshold)
             else:
                 logger.error(f"{nickname} ({hostname}): Failed to get CPU data")
-                print(Colors.red("Failed to get CPU data"))
+                _print(Colors.red("Failed to get CPU data"))
             
             # Check Memory usage
-            print(f"Memory Usage: ", end='')
-            stdin, stdout, stderr = client.exec_command("free | grep Mem")
-            mem_output = stdout.read().decode('utf-8', errors='replace').strip()
+            _print(f"Memory Usage: ", end='')
+            mem_match = _MEM_RE.search(sections.get('MEM', ''))
             
-            if mem_output:
-                mem_parts = mem_output.split()
-                mem_total = int(mem_parts[1])
-                mem_used = int(mem_parts[2])
+            if mem_match:
+                mem_total = int(mem_match.group(1))
+                mem_used = int(mem_match.group(2))
                 mem_usage = (mem_used * 100) / mem_total
                 
                 if mem_usage >= self.mem_threshold:
                     logger.warning(f"{nickname} ({hostname}): High memory usage: {mem_usage:.1f}%")
-                    print(Colors.red(f"{mem_usage:.1f}% (ALERT - above threshold)"))
+                    _print(Colors.red(f"{mem_usage:.1f}% (ALERT - above threshold)"))
                     self.alert_manager.send_alert(nickname, hostname, 
                         f"Memory usage at {mem_usage:.1f}%, threshold is {self.mem_threshold}%")
                 else:
                     logger.info(f"{nickname} ({hostname}): Memory usage: {mem_usage:.1f}%")
-                    print(Colors.green(f"{mem_usage:.1f}%"))
+                    _print(Colors.green(f"{mem_usage:.1f}%"))
                     self.alert_manager.check_alert_resolution(nickname, hostname, "Memory", 
                         mem_usage, self.mem_threshold)
             else:
                 logger.error(f"{nickname} ({hostname}): Failed to get memory data")
-                print(Colors.red("Failed to get Memory data"))
+                _print(Colors.red("Failed to get Memory data"))
             
             # Check Disk usage
-            print(f"Disk Usage: ")
-            stdin, stdout, stderr = client.exec_command(
-                "df -h | grep -v tmpfs | grep -v devtmpfs |grep -v snapd | grep -v Filesystem")
-            disk_output_all = stdout.read().decode('utf-8', errors='replace').strip().split('\n')
+            _print(f"Disk Usage: ")
+            disk_output = sections.get('DISK', '')
             
-            if disk_output_all:
+            if disk_output:
                 critical_disks = []
                 
-                for disk_line in disk_output_all:
-                    if not disk_line.strip():
+                for filesystem, mount_point, usage_str in _DF_RE.findall(disk_output):
+                    # Skip snap mounts (typically read-only and 100% full);
+                    # squashfs, tmpfs and devtmpfs are already excluded by df
+                    if '/snap/' in mount_point or mount_point.startswith('/snap'):
+                        logger.debug(f"Skipping snap filesystem: {filesystem} at {mount_point}")
+                        _print(f"  {mount_point}: {Colors.yellow(f'Skipped (snap)')}")
                         continue
                     
-                    parts = disk_line.split()
-                    if len(parts) >= 5:
-                        filesystem = parts[0]
-                        mount_point = parts[5] if len(parts) >= 6 else parts[0]
-                        usage_str = parts[4].rstrip('%')
-                        
-                        # Skip monitoring for special filesystems that are expected to be full
-                        should_skip = False
-                        
-                        # Skip if filesystem is squashfs (typically read-only and 100% full)
-                        if 'squashfs' in filesystem.lower():
-                            should_skip = True
-                            logger.debug(f"Skipping squashfs filesystem: {filesystem} at {mount_point}")
-                            print(f"  {mount_point}: {Colors.yellow(f'Skipped (squashfs)')}")
-                            
-                        # Skip if filesystem is a snap (typically read-only and 100% full)
-                        if '/snap/' in mount_point or mount_point.startswith('/snap'):
-                            should_skip = True
-                            logger.debug(f"Skipping snap filesystem: {filesystem} at {mount_point}")
-                            print(f"  {mount_point}: {Colors.yellow(f'Skipped (snap)')}")
-                        
-                        if not should_skip:
-                            try:
-                                disk_usage = float(usage_str)
-                                
-                                if disk_usage >= self.disk_threshold:
-                                    critical_disks.append({
-                                        "mount": mount_point,
-                                        "usage": disk_usage,
-                                        "filesystem": filesystem
-                                    })
-                                    print(f"  {mount_point}: {Colors.red(f'{disk_usage:.1f}% (ALERT - above threshold)')}")
-                                else:
-                                    print(f"  {mount_point}: {Colors.green(f'{disk_usage:.1f}%')}")
-                                    # Check for resolution
-                                    resolved = self.alert_manager.check_alert_resolution(
-                                        nickname, hostname, f"disk:{mount_point}",
-                                        disk_usage, self.disk_threshold)
-                                    if resolved:
-                                        print(f"    → Resolution notification sent for {mount_point}")
-                            except ValueError:
-                                print(f"  {mount_point}: {Colors.yellow('Unable to parse usage')}")
+                    disk_usage = float(usage_str)
+                    
+                    if disk_usage >= self.disk_threshold:
+                        critical_disks.append({
+                            "mount": mount_point,
+                            "usage": disk_usage,
+                            "filesystem": filesystem
+                        })
+                        _print(f"  {mount_point}: {Colors.red(f'{disk_usage:.1f}% (ALERT - above threshold)')}")
+                    else:
+                        _print(f"  {mount_point}: {Colors.green(f'{disk_usage:.1f}%')}")
+                        # Check for resolution
+                        resolved = self.alert_manager.check_alert_resolution(
+                            nickname, hostname, f"disk:{mount_point}",
+                            disk_usage, self.disk_threshold)
+                        if resolved:
+                            _print(f"    → Resolution notification sent for {mount_point}")
                 
                 # Send alerts for critical disks with AI suggestions
                 for disk in critical_disks:
@@ -370,45 +651,14 @@ class ServerMonitor:
                     # Get AI suggestion if OpenRouter is configured
                     # Always try to get AI analysis for disk alerts (not just new ones)
                     ai_suggestion = None
-                    if self.ai_assistant.is_configured():
+                    if self._ai_configured:
                         try:
-                            print(f"  Getting AI analysis for {disk['mount']}...")
+                            _print(f"  Getting AI analysis for {disk['mount']}...")
                             
                             # Get df -h output for this specific filesystem
-                            stdin, stdout, stderr = client.exec_command(f"df -h {disk['mount']}")
-                            df_output = stdout.read().decode('utf-8', errors='replace').strip()
-                            
-                            # Get du -sh output for top directories
-                            # For root filesystem, use a more targeted approach to avoid long scans
-                            if disk['mount'] == '/':
-                                # Check specific directories that commonly grow large
-                                du_command = "du -sh /var /tmp /home /opt /usr /root 2>/dev/null | sort -rh"
-                            else:
-                                du_command = f"du -sh {disk['mount']}/* 2>/dev/null | sort -rh | head -20"
+                            df_output = self._exec(client, f"df -h {disk['mount']}")
                             
-                            print(f"    Running disk analysis...")
-                            try:
-                                stdin, stdout, stderr = client.exec_command(du_command, timeout=30)
-                                du_output = stdout.read().decode('utf-8', errors='replace').strip()
-                            except Exception as e:
-                                logger.warning(f"Disk analysis command timed out or failed: {str(e)}")
-                                du_output = ""
-                            
-                            # If du command failed or timed out, try a simpler command
-                            if not du_output or len(du_output) < 10:
-                                print(f"    Using quick analysis mode...")
-                                # Just get the largest subdirectories without recursion
-                                if disk['mount'] == '/':
-                                    # Simpler command that's more likely to work
-                                    du_command = "cd / && du -sh * 2>/dev/null | sort -rh | head -10"
-                                else:
-                                    du_command = f"cd {disk['mount']} && du -sh * 2>/dev/null | sort -rh | head -10"
-                                try:
-                                    stdin, stdout, stderr = client.exec_command(du_command, timeout=10)
-                                    du_output = stdout.read().decode('utf-8', errors='replace').strip()
-                                except Exception as e2:
-                                    logger.warning(f"Quick analysis also failed: {str(e2)}")
-                                    du_output = "Unable to analyze disk usage"
+                            du_output = self._get_du_output(client, hostname, disk['mount'])
                             
                             # Get AI analysis
                             logger.info(f"Calling AI analysis for {nickname} {disk['mount']} - du_output length: {len(du_output)}, df_output length: {len(df_output)}")
@@ -421,38 +671,39 @@ class ServerMonitor:
                                 # Format and append AI suggestion to alert message
                                 formatted_suggestion = self.ai_assistant.format_suggestion_for_alert(ai_suggestion)
                                 alert_msg += formatted_suggestion
-                                print(f"  {Colors.green('AI analysis completed')}")
+                                _print(f"  {Colors.green('AI analysis completed')}")
                             else:
-                                print(f"  {Colors.yellow('AI analysis not available')}")
+                                _print(f"  {Colors.yellow('AI analysis not available')}")
                                 
                         except Exception as e:
                             import traceback
                             logger.error(f"Error getting AI suggestion: {str(e)}\n{traceback.format_exc()}")
-                            print(f"  {Colors.yellow('AI analysis failed: ' + str(e))}")
+                            _print(f"  {Colors.yellow('AI analysis failed: ' + str(e))}")
                     
                     logger.warning(f"{nickname} ({hostname}): {alert_msg}")
                     self.alert_manager.send_alert(nickname, hostname, alert_msg,
                         alert_type=f"disk:{disk['mount']}")
             else:
                 logger.error(f"{nickname} ({hostname}): Failed to get disk data")
-                print(Colors.red("  Failed to get Disk data"))
+                _print(Colors.red("  Failed to get Disk data"))
             
             # Check monitored services if any are configured
             if 'monitored_services' in server and server['monitored_services']:
-                print(f"\nMonitored Services:")
+                _print(f"\nMonitored Services:")
                 services_down = []
+                service_status = _parse_service_status(sections.get('SVC', ''))
                 
                 for service in server['monitored_services']:
-                    print(f"  {service}: ", end='')
-                    is_running = self.check_service_status(client, service)
+                    _print(f"  {service}: ", end='')
+                    is_running = service_status.get(service, False)
                     
                     if is_running:
-                        print(Colors.green("Running"))
+                        _print(Colors.green("Running"))
                         # Check if this resolves an existing alert
                         self.alert_manager.check_alert_resolution(nickname, hostname, 
                             f"service:{service}", 0, 1)
                     else:
-                        print(Colors.red("Not Running"))
+                        _print(Colors.red("Not Running"))
                         services_down.append(service)
                         alert_msg = f"Service {service} is not running"
                         logger.warning(f"{nickname} ({hostname}): {alert_msg}")
@@ -460,18 +711,30 @@ class ServerMonitor:
                             alert_type=f"service:{service}")
                 
                 if not services_down:
-                    print(Colors.green("All monitored services are running"))
+                    _print(Colors.green("All monitored services are running"))
             
-            client.close()
             return True
             
         except Exception as e:
+            self._drop_client(server)
             error_msg = f"Error checking server: {str(e)}"
             logger.error(f"{nickname} ({hostname}): {error_msg}")
-            print(Colors.red(error_msg))
+            _print(Colors.red(error_msg))
             self.alert_manager.send_alert(nickname, hostname, error_msg)
             return False
     
+    def _check_server_buffered(self, server):
+        """Check a server with its console output captured and return the output."""
+        _output.buffer = io.StringIO()
+        try:
+            self.check_server(server)
+        except Exception as e:
+            logger.error(f"Unexpected error checking {server.get('nickname')}: {str(e)}")
+        finally:
+            output = _output.buffer.getvalue()
+            _output.buffer = None
+        return output
+    
     def check_all_servers(self):
         """Check all configured servers."""
         servers = self.server_config.get_servers()
@@ -487,9 +750,10 @@ class ServerMonitor:
         # Start alert session
         self.alert_manager.start_session()
         
-        # Check all servers
-        for server in servers:
-            self.check_server(server)
+        # Check all servers in parallel, printing each server's output in order
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_CHECKS, len(servers))) as executor:
+            for output in executor.map(self._check_server_buffered, servers):
+                print(output, end='')
         
         # End session and send batch notifications
         self.alert_manager.end_session()
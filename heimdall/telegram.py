@@ -7,46 +7,240 @@ This module handles Telegram bot functionality including subscriber management
 and sending alerts via Telegram.
 """
 
-import json
+import os
+import hmac
+import atexit
 import logging
+import secrets
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
+from collections import deque
 import time
 import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .utils import json_loads, json_dumps, write_json_file
 
 CONFIG_FILE = "config.json"
+# Maximum number of subscribers messaged concurrently
+TELEGRAM_SEND_WORKERS = 8
+# Fan-outs to at least this many subscribers are abandoned once over a third fail
+TELEGRAM_ABORT_MIN_BATCH = 30
+# Telegram's overall limit on messages sent by a bot, per second and in a burst
+TELEGRAM_RATE_PER_SEC = 30
+TELEGRAM_BURST = 30
+# Longest Retry-After, in seconds, honoured before giving up on a rate-limited call
+TELEGRAM_MAX_RETRY_AFTER = 10
+# Seconds to wait for further subscriber changes before writing config.json
+TELEGRAM_SAVE_DELAY = 0.5
+# Seconds Telegram holds a getUpdates long poll open when there are no updates
+TELEGRAM_POLL_TIMEOUT = 50
+# Longest wait, in seconds, between getUpdates retries after repeated failures
+TELEGRAM_POLL_MAX_BACKOFF = 30
+# Number of recent update IDs remembered to skip redelivered updates
+TELEGRAM_SEEN_UPDATES = 1024
+# Local address the webhook receiver listens on, behind an HTTPS reverse proxy
+TELEGRAM_WEBHOOK_LISTEN = "127.0.0.1"
+TELEGRAM_WEBHOOK_PORT = 8443
+
 logger = logging.getLogger("Heimdall")
 
+# Headers for Telegram API calls with a pre-encoded JSON body
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Telegram alert and resolution messages, formatted once per notification
+ALERT_TEMPLATE = """<b>{alert_type}</b>
+
+<b>Server:</b> {nickname}
+<b>Hostname:</b> <code>{hostname}</code>
+<b>Issue:</b> {message}
+
+<b>Time:</b> {time}{open_alerts_text}
+
+<i>This is an automated alert from Heimdall Monitoring System.</i>"""
+
+RESOLUTION_TEMPLATE = """<b>✅ ALERT RESOLVED</b>
+
+<b>Server:</b> {nickname}
+<b>Hostname:</b> <code>{hostname}</code>
+<b>Metric:</b> {metric}
+
+<b>Current Value:</b> {current_value:.1f}% (threshold: {threshold}%)
+<b>Duration:</b> {duration_str}
+
+<b>Resolved at:</b> {time}
+
+<i>The issue has been resolved. System is back to normal.</i>{open_alerts_text}"""
+
+# Reply to a new subscription
+WELCOME_MSG = """🎉 <b>Welcome to Heimdall Monitoring!</b>
+
+Your subscription request has been received and is <b>pending approval</b>.
+
+You will start receiving notifications once an administrator approves your subscription.
+
+Available commands:
+/status - Check your subscription status
+/unsubscribe - Cancel your subscription
+/help - Show this help message"""
+
+# Reply to /help
+HELP_MSG = """<b>Heimdall Monitoring Bot Help</b>
+
+Available commands:
+/start or /subscribe - Subscribe to alerts
+/status - Check your subscription status
+/unsubscribe or /stop - Unsubscribe from alerts
+/help - Show this help message
+
+<i>Heimdall monitors your servers and sends alerts when issues are detected.</i>"""
+
+# Short replies to subscription commands
+ALREADY_SUBSCRIBED_MSG = "You are already subscribed to Heimdall alerts! 👍"
+UNSUBSCRIBED_MSG = "You have been unsubscribed from Heimdall alerts. Use /start to subscribe again."
+NOT_SUBSCRIBED_MSG = "You are not currently subscribed."
+STATUS_NOT_SUBSCRIBED_MSG = "❌ You are not subscribed. Use /start to subscribe."
+UNKNOWN_COMMAND_MSG = "Unknown command. Use /help to see available commands."
+
+def create_http_session():
+    """Create a pooled, retrying HTTP session for Telegram API calls."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                          max_retries=Retry(total=2, backoff_factor=0.3))
+    session.mount("https://", adapter)
+    return session
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    """Receive updates pushed by Telegram to the bot's webhook."""
+    
+    def do_POST(self):
+        bot = self.server.bot
+        # Only Telegram knows the secret token given to setWebhook
+        token = self.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(token.encode('utf-8'), bot._webhook_secret.encode('utf-8')):
+            self.send_response(403)
+            self.end_headers()
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            update = json_loads(self.rfile.read(length))
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+        bot._dispatch_update(update)
+        self.send_response(200)
+        self.end_headers()
+    
+    def log_message(self, format, *args):
+        logger.debug(f"Telegram webhook: {format % args}")
+
 class TelegramBot:
-    def __init__(self, config):
+    def __init__(self, config, http_session=None):
         self.config = config
         self.telegram_config = config.get('telegram', {})
         self.bot_token = self.telegram_config.get('bot_token', '')
-        self.subscribers = self.telegram_config.get('subscribers', [])
+        # The config is not reloaded while the bot exists, so decide this once
+        self._configured = bool(self.bot_token) and bool(self.telegram_config.get('enabled', False))
+        # Subscribers are replaced, never mutated, so senders can iterate a
+        # snapshot while the polling thread adds or removes entries
+        self._subscribers = tuple(self.telegram_config.get('subscribers', []))
+        # Subscribers indexed by chat_id for command lookups
+        self._by_chat = {sub['chat_id']: sub for sub in self._subscribers}
+        self._subscribers_lock = threading.Lock()
+        # Pending debounced save, and a lock so only one write runs at a time
+        self._save_timer = None
+        self._save_lock = threading.Lock()
+        atexit.register(self.flush_subscribers)
+        # config.json as last read or written, with the (mtime, size) it had then
+        self._saved_config = None
+        self._saved_config_stat = None
         self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
         self.polling_thread = None
         self.polling_active = False
         self.last_update_id = 0
+        # Public HTTPS URL Telegram pushes updates to; polling is used when unset
+        self.webhook_url = self.telegram_config.get('webhook_url', '')
+        self._webhook_server = None
+        self._webhook_secret = ''
+        # Recently dispatched update IDs, oldest first in the deque
+        self._seen_ids = set()
+        self._seen_order = deque()
+        self._seen_lock = threading.Lock()
+        self._send_pool = None
+        self._update_pool = None
+        # Token bucket pacing outgoing calls to Telegram's rate limit
+        self._bucket = {"tokens": TELEGRAM_BURST, "last": time.monotonic()}
+        self._bucket_lock = threading.Lock()
+        # Keep-alive connections to api.telegram.org shared by all requests,
+        # created on first use so a disabled bot never builds one
+        self._http = http_session
         
+    @property
+    def http(self):
+        """The HTTP session for Telegram API calls."""
+        if self._http is None:
+            self._http = create_http_session()
+        return self._http
+    
+    @property
+    def subscribers(self):
+        """Current subscribers as an immutable snapshot."""
+        return self._subscribers
+    
     def is_configured(self):
         """Check if Telegram bot is properly configured."""
-        return bool(self.bot_token) and self.telegram_config.get('enabled', False)
+        return self._configured
     
     def save_subscribers(self):
-        """Save subscribers list to config file."""
+        """Schedule a save of the subscribers list, coalescing bursts of changes."""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(TELEGRAM_SAVE_DELAY, self.flush_subscribers)
+            self._save_timer.start()
+        return True
+    
+    def flush_subscribers(self):
+        """Save subscribers list to config file now if a save is pending."""
+        with self._save_lock:
+            if self._save_timer is None:
+                return True
+            self._save_timer.cancel()
+            self._save_timer = None
+            return self._write_subscribers()
+    
+    def _save_subscribers_now(self):
+        """Save subscribers list to config file now, replacing any pending save."""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            return self._write_subscribers()
+    
+    def _write_subscribers(self):
+        """Write the current subscribers into config.json."""
         try:
-            # Load current config
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
+            # Load current config, unless it is unchanged since we last wrote it
+            stat = os.stat(CONFIG_FILE)
+            if self._saved_config is not None and self._saved_config_stat == (stat.st_mtime_ns, stat.st_size):
+                config = self._saved_config
+            else:
+                with open(CONFIG_FILE, 'rb') as f:
+                    config = json_loads(f.read())
             
             # Update telegram subscribers
             if 'telegram' not in config:
                 config['telegram'] = {}
-            config['telegram']['subscribers'] = self.subscribers
+            config['telegram']['subscribers'] = list(self.subscribers)
             
             # Save back to file
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(config, f, indent=2)
+            write_json_file(CONFIG_FILE, config)
+            stat = os.stat(CONFIG_FILE)
+            self._saved_config = config
+            self._saved_config_stat = (stat.st_mtime_ns, stat.st_size)
                 
             logger.info(f"Saved {len(self.subscribers)} Telegram subscribers")
             return True
@@ -56,54 +250,66 @@ class TelegramBot:
     
     def add_subscriber(self, chat_id, username=None, first_name=None):
         """Add a new subscriber."""
-        # Check if already subscribed
-        for sub in self.subscribers:
-            if sub['chat_id'] == chat_id:
+        with self._subscribers_lock:
+            # Check if already subscribed
+            if chat_id in self._by_chat:
                 logger.info(f"User {chat_id} already subscribed")
                 return False
 
-        # Add new subscriber (default: not approved)
-        subscriber = {
-            'chat_id': chat_id,
-            'username': username,
-            'first_name': first_name,
-            'subscribed_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'approved': False
-        }
-        self.subscribers.append(subscriber)
+            # Add new subscriber (default: not approved)
+            subscriber = {
+                'chat_id': chat_id,
+                'username': username,
+                'first_name': first_name,
+                'subscribed_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'approved': False
+            }
+            self._by_chat = {**self._by_chat, chat_id: subscriber}
+            self._subscribers = self._subscribers + (subscriber,)
         self.save_subscribers()
         logger.info(f"Added new Telegram subscriber (pending approval): {username or first_name or chat_id}")
         return True
     
     def remove_subscriber(self, chat_id):
         """Remove a subscriber."""
-        for i, sub in enumerate(self.subscribers):
-            if sub['chat_id'] == chat_id:
-                removed = self.subscribers.pop(i)
-                self.save_subscribers()
-                logger.info(f"Removed Telegram subscriber: {removed.get('username', chat_id)}")
-                return True
-        return False
+        with self._subscribers_lock:
+            removed = self._by_chat.get(chat_id)
+            if removed is None:
+                return False
+            self._by_chat = {key: sub for key, sub in self._by_chat.items() if key != chat_id}
+            self._subscribers = tuple(sub for sub in self._subscribers if sub is not removed)
+        self._save_subscribers_now()
+        logger.info(f"Removed Telegram subscriber: {removed.get('username', chat_id)}")
+        return True
+
+    def _set_approved(self, chat_id, approved):
+        """Replace a subscriber with a copy carrying the new approval state."""
+        with self._subscribers_lock:
+            old = self._by_chat.get(chat_id)
+            if old is None:
+                return None
+            sub = {**old, 'approved': approved}
+            self._by_chat = {**self._by_chat, chat_id: sub}
+            self._subscribers = tuple(sub if s is old else s for s in self._subscribers)
+        return sub
 
     def approve_subscriber(self, chat_id):
         """Approve a subscriber."""
-        for sub in self.subscribers:
-            if sub['chat_id'] == chat_id:
-                sub['approved'] = True
-                self.save_subscribers()
-                logger.info(f"Approved Telegram subscriber: {sub.get('username') or sub.get('first_name') or chat_id}")
-                return True
-        return False
+        sub = self._set_approved(chat_id, True)
+        if sub is None:
+            return False
+        self._save_subscribers_now()
+        logger.info(f"Approved Telegram subscriber: {sub.get('username') or sub.get('first_name') or chat_id}")
+        return True
 
     def disapprove_subscriber(self, chat_id):
         """Disapprove a subscriber."""
-        for sub in self.subscribers:
-            if sub['chat_id'] == chat_id:
-                sub['approved'] = False
-                self.save_subscribers()
-                logger.info(f"Disapproved Telegram subscriber: {sub.get('username') or sub.get('first_name') or chat_id}")
-                return True
-        return False
+        sub = self._set_approved(chat_id, False)
+        if sub is None:
+            return False
+        self._save_subscribers_now()
+        logger.info(f"Disapproved Telegram subscriber: {sub.get('username') or sub.get('first_name') or chat_id}")
+        return True
 
     def get_pending_subscribers(self):
         """Get list of subscribers pending approval."""
@@ -113,6 +319,35 @@ class TelegramBot:
         """Get list of approved subscribers."""
         return [sub for sub in self.subscribers if sub.get('approved', False)]
     
+    def _wait_for_send_token(self):
+        """Block until the rate limit bucket has a token, then take it."""
+        with self._bucket_lock:
+            bucket = self._bucket
+            while True:
+                now = time.monotonic()
+                bucket["tokens"] = min(TELEGRAM_BURST, bucket["tokens"] + (now - bucket["last"]) * TELEGRAM_RATE_PER_SEC)
+                bucket["last"] = now
+                if bucket["tokens"] >= 1:
+                    bucket["tokens"] -= 1
+                    return
+                time.sleep((1 - bucket["tokens"]) / TELEGRAM_RATE_PER_SEC)
+    
+    def _post_json(self, url, payload, timeout=10):
+        """POST a JSON payload over the shared session, raising on HTTP errors."""
+        data = json_dumps(payload, indent=False)
+        self._wait_for_send_token()
+        response = self.http.post(url, data=data, headers=JSON_HEADERS, timeout=timeout)
+        if response.status_code == 429:
+            # Rate limited anyway (e.g. per chat), retry once after the advised delay
+            retry_after = json_loads(response.content).get('parameters', {}).get('retry_after', 1)
+            if retry_after <= TELEGRAM_MAX_RETRY_AFTER:
+                logger.warning(f"Telegram rate limit hit, retrying in {retry_after}s")
+                time.sleep(retry_after)
+                self._wait_for_send_token()
+                response = self.http.post(url, data=data, headers=JSON_HEADERS, timeout=timeout)
+        response.raise_for_status()
+        return response
+    
     def send_message(self, chat_id, text, parse_mode='HTML'):
         """Send a message to a specific chat."""
         try:
@@ -122,37 +357,60 @@ class TelegramBot:
                 'text': text,
                 'parse_mode': parse_mode
             }
-            response = requests.post(url, json=payload, timeout=10)
-            response.raise_for_status()
+            self._post_json(url, payload)
             return True
         except Exception as e:
             logger.error(f"Failed to send Telegram message to {chat_id}: {str(e)}")
             return False
     
+    def send_to_subscribers(self, subscribers, text):
+        """Send a message to several subscribers concurrently.
+
+        Returns a list of (subscriber, sent) pairs in completion order. Large
+        fan-outs stop early when too many sends fail, and the skipped
+        subscribers are left out of the result.
+        """
+        if not subscribers:
+            return []
+        if self._send_pool is None:
+            self._send_pool = ThreadPoolExecutor(max_workers=TELEGRAM_SEND_WORKERS,
+                                                 thread_name_prefix="telegram-send")
+        futures = {self._send_pool.submit(self.send_message, sub['chat_id'], text): sub
+                   for sub in subscribers}
+        results = []
+        failures = 0
+        max_failures = len(subscribers) // 3 if len(subscribers) >= TELEGRAM_ABORT_MIN_BATCH else len(subscribers)
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            sent = future.result()
+            results.append((futures[future], sent))
+            if not sent:
+                failures += 1
+                if failures == max_failures + 1:
+                    skipped = sum(1 for pending in futures if pending.cancel())
+                    logger.error(f"Aborting Telegram send after {failures} failures, skipping {skipped} subscribers")
+        return results
+    
     def send_alert_to_all(self, nickname, hostname, message, is_new_alert=True, open_alerts_text=""):
         """Send alert to all approved subscribers."""
         if not self.is_configured():
             return False
 
+        # Send to approved subscribers only, skip formatting if there are none
+        approved_subscribers = self.get_approved_subscribers()
+        if not approved_subscribers:
+            return False
+
         # Format the alert message
         alert_type = "🚨 NEW ALERT" if is_new_alert else "⚠️ RECURRING ALERT"
 
-        text = f"""<b>{alert_type}</b>
+        text = ALERT_TEMPLATE.format(alert_type=alert_type, nickname=nickname, hostname=hostname,
+                                     message=message, time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                     open_alerts_text=open_alerts_text)
 
-<b>Server:</b> {nickname}
-<b>Hostname:</b> <code>{hostname}</code>
-<b>Issue:</b> {message}
-
-<b>Time:</b> {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}{open_alerts_text}
-
-<i>This is an automated alert from Heimdall Monitoring System.</i>"""
-
-        # Send to approved subscribers only
-        approved_subscribers = self.get_approved_subscribers()
-        sent_count = 0
-        for subscriber in approved_subscribers:
-            if self.send_message(subscriber['chat_id'], text):
-                sent_count += 1
+        results = self.send_to_subscribers(approved_subscribers, text)
+        sent_count = sum(1 for _, sent in results if sent)
 
         logger.info(f"Sent Telegram alert to {sent_count}/{len(approved_subscribers)} approved subscribers")
         return sent_count > 0
@@ -162,25 +420,19 @@ class TelegramBot:
         if not self.is_configured():
             return False
 
-        text = f"""<b>✅ ALERT RESOLVED</b>
-
-<b>Server:</b> {nickname}
-<b>Hostname:</b> <code>{hostname}</code>
-<b>Metric:</b> {metric}
-
-<b>Current Value:</b> {current_value:.1f}% (threshold: {threshold}%)
-<b>Duration:</b> {duration_str}
+        # Send to approved subscribers only, skip formatting if there are none
+        approved_subscribers = self.get_approved_subscribers()
+        if not approved_subscribers:
+            return False
 
-<b>Resolved at:</b> {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        text = RESOLUTION_TEMPLATE.format(nickname=nickname, hostname=hostname, metric=metric,
+                                          current_value=current_value, threshold=threshold,
+                                          duration_str=duration_str,
+                                          time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                          open_alerts_text=open_alerts_text)
 
-<i>The issue has been resolved. System is back to normal.</i>{open_alerts_text}"""
-
-        # Send to approved subscribers only
-        approved_subscribers = self.get_approved_subscribers()
-        sent_count = 0
-        for subscriber in approved_subscribers:
-            if self.send_message(subscriber['chat_id'], text):
-                sent_count += 1
+        results = self.send_to_subscribers(approved_subscribers, text)
+        sent_count = sum(1 for _, sent in results if sent)
 
         logger.info(f"Sent Telegram resolution to {sent_count}/{len(approved_subscribers)} approved subscribers")
         return sent_count > 0
@@ -199,96 +451,115 @@ class TelegramBot:
             if not chat_id or not text:
                 return
             
-            # Process commands
-            if text.lower() == '/start' or text.lower() == '/subscribe':
-                if self.add_subscriber(chat_id, username, first_name):
-                    welcome_msg = """🎉 <b>Welcome to Heimdall Monitoring!</b>
-
-Your subscription request has been received and is <b>pending approval</b>.
-
-You will start receiving notifications once an administrator approves your subscription.
-
-Available commands:
-/status - Check your subscription status
-/unsubscribe - Cancel your subscription
-/help - Show this help message"""
-                    self.send_message(chat_id, welcome_msg)
-                else:
-                    self.send_message(chat_id, "You are already subscribed to Heimdall alerts! 👍")
-            
-            elif text.lower() == '/unsubscribe' or text.lower() == '/stop':
-                if self.remove_subscriber(chat_id):
-                    self.send_message(chat_id, "You have been unsubscribed from Heimdall alerts. Use /start to subscribe again.")
-                else:
-                    self.send_message(chat_id, "You are not currently subscribed.")
-            
-            elif text.lower() == '/status':
-                # Find subscriber info
-                subscriber = None
-                for sub in self.subscribers:
-                    if sub['chat_id'] == chat_id:
-                        subscriber = sub
-                        break
+            # Process commands, looking only at the first word
+            words = text.split(None, 1)
+            command = words[0].lower() if words else ''
+            handler = self._COMMANDS.get(command, TelegramBot._cmd_unknown)
+            handler(self, chat_id, username, first_name)
+                
+        except Exception as e:
+            logger.error(f"Error processing Telegram update: {str(e)}")
+    
+    def _cmd_subscribe(self, chat_id, username, first_name):
+        """Handle /start and /subscribe."""
+        if self.add_subscriber(chat_id, username, first_name):
+            self.send_message(chat_id, WELCOME_MSG)
+        else:
+            self.send_message(chat_id, ALREADY_SUBSCRIBED_MSG)
+    
+    def _cmd_unsubscribe(self, chat_id, username, first_name):
+        """Handle /unsubscribe and /stop."""
+        if self.remove_subscriber(chat_id):
+            self.send_message(chat_id, UNSUBSCRIBED_MSG)
+        else:
+            self.send_message(chat_id, NOT_SUBSCRIBED_MSG)
+    
+    def _cmd_status(self, chat_id, username, first_name):
+        """Handle /status."""
+        # Find subscriber info
+        subscriber = self._by_chat.get(chat_id)
 
-                if subscriber:
-                    approved = subscriber.get('approved', False)
-                    status_emoji = "✅" if approved else "⏳"
-                    status_text = "Approved" if approved else "Pending Approval"
+        if subscriber:
+            approved = subscriber.get('approved', False)
+            status_emoji = "✅" if approved else "⏳"
+            status_text = "Approved" if approved else "Pending Approval"
 
-                    status_msg = f"""<b>Your Subscription Status</b>
+            status_msg = f"""<b>Your Subscription Status</b>
 
 {status_emoji} <b>Status:</b> {status_text}
 📅 <b>Subscribed since:</b> {subscriber.get('subscribed_at', 'Unknown')}
 👥 <b>Total subscribers:</b> {len(self.subscribers)}"""
 
-                    if not approved:
-                        status_msg += "\n\n<i>You will start receiving alerts once an administrator approves your subscription.</i>"
-
-                    self.send_message(chat_id, status_msg)
-                else:
-                    self.send_message(chat_id, "❌ You are not subscribed. Use /start to subscribe.")
-            
-            elif text.lower() == '/help':
-                help_msg = """<b>Heimdall Monitoring Bot Help</b>
-
-Available commands:
-/start or /subscribe - Subscribe to alerts
-/status - Check your subscription status
-/unsubscribe or /stop - Unsubscribe from alerts
-/help - Show this help message
+            if not approved:
+                status_msg += "\n\n<i>You will start receiving alerts once an administrator approves your subscription.</i>"
 
-<i>Heimdall monitors your servers and sends alerts when issues are detected.</i>"""
-                self.send_message(chat_id, help_msg)
-            
-            else:
-                # Unknown command
-                self.send_message(chat_id, "Unknown command. Use /help to see available commands.")
-                
-        except Exception as e:
-            logger.error(f"Error processing Telegram update: {str(e)}")
+            self.send_message(chat_id, status_msg)
+        else:
+            self.send_message(chat_id, STATUS_NOT_SUBSCRIBED_MSG)
+    
+    def _cmd_help(self, chat_id, username, first_name):
+        """Handle /help."""
+        self.send_message(chat_id, HELP_MSG)
+    
+    def _cmd_unknown(self, chat_id, username, first_name):
+        """Reply to anything that is not a known command."""
+        self.send_message(chat_id, UNKNOWN_COMMAND_MSG)
+    
+    # Command handlers by lowercased first word of the message
+    _COMMANDS = {
+        '/start': _cmd_subscribe,
+        '/subscribe': _cmd_subscribe,
+        '/unsubscribe': _cmd_unsubscribe,
+        '/stop': _cmd_unsubscribe,
+        '/status': _cmd_status,
+        '/help': _cmd_help,
+    }
+    
+    def _dispatch_update(self, update):
+        """Queue a webhook update for processing, one at a time and in order."""
+        update_id = update.get('update_id')
+        if update_id is not None:
+            with self._seen_lock:
+                # Telegram may deliver an update again, e.g. a retried webhook call
+                if update_id in self._seen_ids:
+                    logger.debug(f"Skipping duplicate Telegram update {update_id}")
+                    return
+                if len(self._seen_order) >= TELEGRAM_SEEN_UPDATES:
+                    self._seen_ids.discard(self._seen_order.popleft())
+                self._seen_order.append(update_id)
+                self._seen_ids.add(update_id)
+        if self._update_pool is None:
+            self._update_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="telegram-update")
+        self._update_pool.submit(self.process_update, update)
     
     def poll_updates(self):
         """Poll for Telegram updates (for handling subscriptions)."""
+        failures = 0
         while self.polling_active:
             try:
                 url = f"{self.base_url}/getUpdates"
                 params = {
                     'offset': self.last_update_id + 1,
-                    'timeout': 30  # Long polling
+                    'timeout': TELEGRAM_POLL_TIMEOUT  # Long polling
                 }
-                response = requests.get(url, params=params, timeout=35)
+                response = self.http.get(url, params=params, timeout=TELEGRAM_POLL_TIMEOUT + 5)
+                response.raise_for_status()
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('ok'):
-                        updates = data.get('result', [])
-                        for update in updates:
-                            self.process_update(update)
-                            self.last_update_id = update.get('update_id', self.last_update_id)
+                data = json_loads(response.content)
+                if data.get('ok'):
+                    # Process updates here rather than on the update pool, and
+                    # acknowledge each one with the next offset only once it
+                    # is handled, so a crash cannot drop queued updates
+                    for update in data.get('result', []):
+                        self.process_update(update)
+                        self.last_update_id = max(update.get('update_id', 0), self.last_update_id)
+                failures = 0
                 
             except Exception as e:
+                failures += 1
                 logger.error(f"Error polling Telegram updates: {str(e)}")
-                time.sleep(5)  # Wait before retrying
+                # Back off exponentially while the API keeps failing
+                time.sleep(min(TELEGRAM_POLL_MAX_BACKOFF, 2 ** failures))
     
     def start_polling(self):
         """Start polling for updates in a separate thread."""
@@ -296,6 +567,9 @@ Available commands:
             logger.warning("Telegram bot not configured, skipping polling")
             return False
         
+        if self.webhook_url:
+            return self.start_webhook()
+        
         if self.polling_thread and self.polling_thread.is_alive():
             logger.warning("Telegram polling already active")
             return False
@@ -306,9 +580,54 @@ Available commands:
         logger.info("Started Telegram bot polling")
         return True
     
+    def start_webhook(self):
+        """Register the webhook with Telegram and serve pushed updates in a separate thread."""
+        if self._webhook_server is not None:
+            logger.warning("Telegram webhook already active")
+            return False
+        
+        listen = self.telegram_config.get('webhook_listen', TELEGRAM_WEBHOOK_LISTEN)
+        port = self.telegram_config.get('webhook_port', TELEGRAM_WEBHOOK_PORT)
+        self._webhook_secret = self.telegram_config.get('webhook_secret') or secrets.token_urlsafe(32)
+        try:
+            server = ThreadingHTTPServer((listen, port), _WebhookHandler)
+        except OSError as e:
+            logger.error(f"Failed to listen for Telegram webhook on {listen}:{port}: {str(e)}")
+            return False
+        server.bot = self
+        
+        try:
+            payload = {'url': self.webhook_url, 'secret_token': self._webhook_secret}
+            self._post_json(f"{self.base_url}/setWebhook", payload)
+        except Exception as e:
+            logger.error(f"Failed to register Telegram webhook: {str(e)}")
+            server.server_close()
+            return False
+        
+        self._webhook_server = server
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(f"Started Telegram webhook on {listen}:{port} for {self.webhook_url}")
+        return True
+    
+    def stop_webhook(self):
+        """Stop the webhook receiver and unregister it so polling works again."""
+        if self._webhook_server is None:
+            return
+        self._webhook_server.shutdown()
+        self._webhook_server.server_close()
+        self._webhook_server = None
+        try:
+            # Telegram holds undelivered updates until the next webhook or getUpdates
+            self.http.post(f"{self.base_url}/deleteWebhook", timeout=10).raise_for_status()
+        except Exception as e:
+            logger.error(f"Failed to unregister Telegram webhook: {str(e)}")
+        logger.info("Stopped Telegram webhook")
+    
     def stop_polling(self):
         """Stop polling for updates."""
         self.polling_active = False
+        self.stop_webhook()
+        self.flush_subscribers()
         if self.polling_thread:
             self.polling_thread.join(timeout=5)
         logger.info("Stopped Telegram bot polling")
@@ -317,7 +636,7 @@ Available commands:
         """Test the bot connection by getting bot info."""
         try:
             url = f"{self.base_url}/getMe"
-            response = requests.get(url, timeout=10)
+            response = self.http.get(url, timeout=10)
             response.raise_for_status()
             data = response.json()
             if data.get('ok'):
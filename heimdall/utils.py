@@ -8,53 +8,121 @@ including terminal colors and logging setup.
 """
 
 import os
+import json
+import stat
+import tempfile
+import queue
+import atexit
 import logging
+import logging.handlers
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib
+    orjson = None
 
 # Log file location
 LOG_FILE = "logs/heimdall.log"
 ALERT_LOG_FILE = "logs/alerts.log"
 
+# Size at which heimdall.log is rotated, and how many old logs are kept
+LOG_MAX_BYTES = 10_000_000
+LOG_BACKUP_COUNT = 5
+
 def setup_logging():
     """Setup logging configuration for the application."""
     # Create logs directory if it doesn't exist
     os.makedirs('logs', exist_ok=True)
     
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE),
-            logging.StreamHandler()
-        ]
-    )
+    # Configure logging once; records are queued and written to the log file
+    # and console by a background listener so callers never block on I/O
+    root = logging.getLogger()
+    if not root.handlers:
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+        stream_handler = logging.StreamHandler()
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
+        
+        records = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, file_handler, stream_handler,
+                                                  respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        root.addHandler(logging.handlers.QueueHandler(records))
+        root.setLevel(logging.INFO)
     return logging.getLogger("Heimdall")
 
+def json_loads(data):
+    """Parse JSON from bytes or str, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(obj, indent=True):
+    """Serialize an object to JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    return json.dumps(obj, indent=2 if indent else None).encode('utf-8')
+
+def write_json_file(path, obj):
+    """Write an object as JSON to path atomically via a temporary file.
+
+    The file keeps its existing permissions (0600 for a new file), since
+    config files hold passwords and tokens.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            try:
+                os.fchmod(f.fileno(), stat.S_IMODE(os.stat(path).st_mode))
+            except FileNotFoundError:
+                pass
+            f.write(json_dumps(obj))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# ANSI escape codes, also exposed as Colors attributes
+_RED = '\033[91m'
+_GREEN = '\033[92m'
+_YELLOW = '\033[93m'
+_BLUE = '\033[94m'
+_END = '\033[0m'
+_BOLD = '\033[1m'
+
 class Colors:
     """ANSI Colors for terminal output."""
-    RED = '\033[91m'
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m'
-    BLUE = '\033[94m'
-    END = '\033[0m'
-    BOLD = '\033[1m'
+    RED = _RED
+    GREEN = _GREEN
+    YELLOW = _YELLOW
+    BLUE = _BLUE
+    END = _END
+    BOLD = _BOLD
     
-    @classmethod
-    def red(cls, text):
-        return f"{cls.RED}{text}{cls.END}"
+    @staticmethod
+    def red(text):
+        return f"{_RED}{text}{_END}"
     
-    @classmethod
-    def green(cls, text):
-        return f"{cls.GREEN}{text}{cls.END}"
+    @staticmethod
+    def green(text):
+        return f"{_GREEN}{text}{_END}"
     
-    @classmethod
-    def yellow(cls, text):
-        return f"{cls.YELLOW}{text}{cls.END}"
+    @staticmethod
+    def yellow(text):
+        return f"{_YELLOW}{text}{_END}"
     
-    @classmethod
-    def blue(cls, text):
-        return f"{cls.BLUE}{text}{cls.END}"
+    @staticmethod
+    def blue(text):
+        return f"{_BLUE}{text}{_END}"
     
-    @classmethod
-    def bold(cls, text):
-        return f"{cls.BOLD}{text}{cls.END}"
+    @staticmethod
+    def bold(text):
+        return f"{_BOLD}{text}{_END}"